@@ -4,9 +4,13 @@ import json
 import logging
 import os
 import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
 from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Any, Dict, Generator, List, Tuple
+from typing import Any, Dict, Generator, Iterable, List, Tuple
 
 import requests
 from django.conf import settings
@@ -32,6 +36,94 @@ PUBLIC_KEY = Path(get_setting("MIGASFREE_KEYS_DIR")) / "migasfree-server.pub"
 TMP_DIR = Path("/tmp")
 OLD_STORE_TRAILING = "STORES"
 
+UPLOAD_WORKERS = 8  # Concurrent uploads (each one is signed and processed by core)
+PAGE_SIZE = 1000  # Results per page in bulk lookups
+JOURNAL_NAME = ".migrate_packages.journal"  # In MEDIA_ROOT, removed after a complete run
+PROGRESS_INTERVAL = 10  # seconds
+
+
+def _contains(needle: str, haystack: str) -> bool:
+    """Same matching as the API icontains filters"""
+    return needle.lower() in (haystack or "").lower()
+
+
+def _format_duration(seconds: float) -> str:
+    seconds = int(seconds)
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+class Journal:
+    """Append-only record of migrated items, so an interrupted run can resume."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.done = set()
+        if path.exists():
+            for line in path.read_text().splitlines():
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # Partial line written during a crash
+                self.done.add((entry["kind"], entry["item"]))
+            logger.info(f"Resuming migration: {len(self.done)} items already migrated")
+
+    def is_done(self, kind: str, item: Path) -> bool:
+        return (kind, str(item)) in self.done
+
+    def mark_done(self, kind: str, item: Path) -> None:
+        with self.lock:
+            self.done.add((kind, str(item)))
+            with self.path.open("a") as f:
+                f.write(json.dumps({"kind": kind, "item": str(item)}) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    def remove(self) -> None:
+        self.path.unlink(missing_ok=True)
+
+
+class Progress:
+    """Thread-safe progress counter that logs throughput and time remaining."""
+
+    def __init__(self, label: str, total: int, total_bytes: int):
+        self.label = label
+        self.total = total
+        self.total_bytes = total_bytes
+        self.done = 0
+        self.done_bytes = 0
+        self.failed = 0
+        self.start = time.monotonic()
+        self.last_report = self.start
+        self.lock = threading.Lock()
+
+    def update(self, size: int, ok: bool = True) -> None:
+        with self.lock:
+            self.done += 1
+            self.done_bytes += size
+            if not ok:
+                self.failed += 1
+            now = time.monotonic()
+            if now - self.last_report >= PROGRESS_INTERVAL or self.done == self.total:
+                self.last_report = now
+                self.report(now)
+
+    def report(self, now: float) -> None:
+        elapsed = max(now - self.start, 0.001)
+        rate = self.done / elapsed
+        byte_rate = self.done_bytes / elapsed
+        # Uploads cost is mostly proportional to size
+        if byte_rate:
+            remaining = (self.total_bytes - self.done_bytes) / byte_rate
+        else:
+            remaining = (self.total - self.done) / rate if rate else 0
+        logger.info(
+            f"{self.label}: {self.done}/{self.total} "
+            f"({self.done * 100 / max(self.total, 1):.1f}%, {self.failed} failed), "
+            f"{rate:.1f} items/s, {byte_rate / (1024 * 1024):.1f} MiB/s, "
+            f"ETA {_format_duration(remaining)}"
+        )
+
 
 class Migrator:
     def __init__(self):
@@ -45,8 +137,11 @@ class Migrator:
             status_forcelist=[500, 502, 503, 504],
             raise_on_status=False,
         )
-        self.session.mount("http://", HTTPAdapter(max_retries=retries))
-        self.session.mount("https://", HTTPAdapter(max_retries=retries))
+        adapter = HTTPAdapter(max_retries=retries, pool_maxsize=UPLOAD_WORKERS)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.journal = Journal(Path(settings.MEDIA_ROOT) / JOURNAL_NAME)
 
     def _get_auth_token(self) -> str:
         import os
@@ -120,24 +215,28 @@ class Migrator:
         )
 
         my_magic = build_magic()
-        file_list: List[Tuple[str, Tuple[str, bytes, str]]] = []
+        file_list: List[Tuple[str, Tuple[str, Any, str]]] = []
+        handles = []
 
-        for _file in upload_files:
-            content = _file.read_bytes()
-            tmp_header = TMP_DIR / _file.name
-            tmp_header.write_bytes(content[:1024])
-            mime = my_magic.file(str(tmp_header))
-            tmp_header.unlink(missing_ok=True)
+        try:
+            for _file in upload_files:
+                # Files are streamed by the encoder: only the header is read here
+                handle = _file.open("rb")
+                handles.append(handle)
+                with tempfile.NamedTemporaryFile(dir=TMP_DIR) as tmp_header:
+                    tmp_header.write(handle.read(1024))
+                    tmp_header.flush()
+                    mime = my_magic.file(tmp_header.name)
+                handle.seek(0)
 
-            file_list.append(("file", (_file.name, content, mime)))
+                file_list.append(("file", (_file.name, handle, mime)))
 
-        fields = json.loads(payload)
-        fields.update(dict(file_list))
+            fields = json.loads(payload)
+            fields.update(dict(file_list))
 
-        encoder = MultipartEncoder(fields=fields)
-        headers = {"Content-Type": encoder.content_type}
+            encoder = MultipartEncoder(fields=fields)
+            headers = {"Content-Type": encoder.content_type}
 
-        try:
             resp = self.session.post(UPLOAD_PKG_URL, data=encoder, headers=headers)
             resp.raise_for_status()
             json_resp = resp.json()
@@ -149,12 +248,37 @@ class Migrator:
                     verify_key=str(PUBLIC_KEY),
                 )
             return json_resp
-        except requests.RequestException as e:
+        except (requests.RequestException, OSError) as e:
             logger.error(f"Upload failed for {data.get('fullname')}: {e}")
             return {"error": str(e)}
-
-    def migrate_packages(self) -> None:
-        """Finds and migrates individual packages based on Ic-containing match."""
+        finally:
+            for handle in handles:
+                handle.close()
+
+    def _fetch_all(self, endpoint: str) -> List[Dict[str, Any]]:
+        """Bulk lookup: every object of an API list endpoint, following pagination."""
+        results = []
+        url = f"{API_URL}/{endpoint}/"
+        params = {"page_size": PAGE_SIZE}
+        while url:
+            resp = self.session.get(url, params=params)
+            resp.raise_for_status()
+            data = resp.json()
+            results.extend(data["results"])
+            url = data.get("next")
+            params = None  # Already included in the next link
+        return results
+
+    def _run_pool(self, task, items: Iterable[Any]) -> None:
+        with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as executor:
+            for _ in executor.map(task, items):
+                pass
+
+    def migrate_packages(self) -> int:
+        """
+        Finds and migrates individual packages matched by name, project and store.
+        Returns the number of packages that could not be migrated.
+        """
         media_root = Path(settings.MEDIA_ROOT)
         packages: List[Dict[str, Any]] = []
 
@@ -162,113 +286,153 @@ class Migrator:
             # Calculate depth relative to media root
             base_parts = location.relative_to(media_root).parts
             for item in location.iterdir():
-                if item.is_file():
+                if item.is_file() and not self.journal.is_done("package", item):
                     packages.append(
                         {
                             "location": item,
                             "fullname": item.name,
                             "project": base_parts[0],
                             "store": base_parts[-1],
+                            "size": item.stat().st_size,
                         }
                     )
 
-        for pkg in packages:
-            try:
-                resp = self.session.get(
-                    f"{API_URL}/packages/",
-                    params={
-                        "fullname__icontains": pkg["fullname"],
-                        "project__name__icontains": pkg["project"],
-                        "store__name__icontains": pkg["store"],
-                    },
-                )
-                resp.raise_for_status()
-                data = resp.json()
-
-                if data["count"] == 1:
-                    target = data["results"][0]
-                    logger.info(f"Migrating {target['fullname']}...")
-                    self.upload_package(
-                        data={
-                            "project": target["project"]["name"],
-                            "store": target["store"]["name"],
-                            "is_package": True,
-                        },
-                        upload_files=[pkg["location"]],
-                    )
-            except requests.RequestException as e:
-                logger.warning(f"Could not query package {pkg['fullname']}: {e}")
+        if not packages:
+            logger.info("No packages to migrate.")
+            return 0
 
-    def migrate_package_sets(self) -> None:
-        """Finds and migrates package sets by matching directory structures."""
+        try:
+            existing = defaultdict(list)
+            for target in self._fetch_all("packages"):
+                existing[target["fullname"]].append(target)
+        except requests.RequestException as e:
+            logger.error(f"Could not query packages: {e}")
+            return len(packages)
+
+        progress = Progress("Packages", len(packages), sum(p["size"] for p in packages))
+
+        def _migrate(pkg):
+            matches = [
+                target
+                for target in existing.get(pkg["fullname"], [])
+                if _contains(pkg["project"], target["project"]["name"])
+                and _contains(pkg["store"], target["store"]["name"])
+            ]
+            if len(matches) != 1:
+                progress.update(pkg["size"])
+                return
+
+            target = matches[0]
+            logger.debug(f"Migrating {target['fullname']}...")
+            result = self.upload_package(
+                data={
+                    "project": target["project"]["name"],
+                    "store": target["store"]["name"],
+                    "is_package": True,
+                },
+                upload_files=[pkg["location"]],
+            )
+            ok = "error" not in result
+            if ok:
+                self.journal.mark_done("package", pkg["location"])
+            progress.update(pkg["size"], ok)
+
+        self._run_pool(_migrate, packages)
+        return progress.failed
+
+    def migrate_package_sets(self) -> int:
+        """
+        Finds and migrates package sets by matching directory structures.
+        Returns the number of package sets that could not be migrated.
+        """
         media_root = Path(settings.MEDIA_ROOT)
         package_sets: List[Dict[str, Any]] = []
 
         for location in self.get_locations():
             for entry in location.iterdir():
-                if entry.is_dir() and any(entry.iterdir()):
+                if (
+                    entry.is_dir()
+                    and any(entry.iterdir())
+                    and not self.journal.is_done("package_set", entry)
+                ):
                     parts = entry.relative_to(media_root).parts
+                    files = [f for f in entry.iterdir() if f.is_file()]
                     package_sets.append(
                         {
                             "location": entry,
                             "name": entry.name,
                             "project": parts[0],
                             "store": parts[-2],
-                            "packages": [
-                                f.name for f in entry.iterdir() if f.is_file()
-                            ],
+                            "packages": [f.name for f in files],
+                            "size": sum(f.stat().st_size for f in files),
                         }
                     )
 
-        for pset in package_sets:
+        if not package_sets:
+            logger.info("No package sets to migrate.")
+            return 0
+
+        try:
+            existing = defaultdict(list)
+            for target in self._fetch_all("package-sets"):
+                existing[target["name"]].append(target)
+        except requests.RequestException as e:
+            logger.error(f"Could not query package sets: {e}")
+            return len(package_sets)
+
+        progress = Progress(
+            "Package sets", len(package_sets), sum(p["size"] for p in package_sets)
+        )
+
+        def _migrate(pset):
+            matches = [
+                target
+                for target in existing.get(pset["name"], [])
+                if _contains(pset["project"], target["project"]["name"])
+                and _contains(pset["store"], target["store"]["name"])
+            ]
+            if len(matches) != 1:
+                progress.update(pset["size"])
+                return
+
+            target = matches[0]
+            logger.debug(f"Migrating package set {target['name']}...")
+            mimetype = get_pms(target["project"]["pms"]).mimetype[0]
+            files_to_upload = []
+            handles = []
+            ok = False
             try:
-                resp = self.session.get(
-                    f"{API_URL}/package-sets/",
-                    params={
-                        "name": pset["name"],
-                        "project__name__icontains": pset["project"],
-                        "store__name__icontains": pset["store"],
-                    },
+                # File objects are streamed by the encoder instead of read into memory
+                for pkg_name in pset["packages"]:
+                    handle = (pset["location"] / pkg_name).open("rb")
+                    handles.append(handle)
+                    files_to_upload.append(("files", (pkg_name, handle, mimetype)))
+
+                encoder = MultipartEncoder(fields=files_to_upload)
+                patch_resp = self.session.patch(
+                    f"{API_URL}/package-sets/{target['id']}/",
+                    data=encoder,
+                    headers={"Content-Type": encoder.content_type},
                 )
-                resp.raise_for_status()
-                data = resp.json()
-
-                if data["count"] == 1:
-                    target = data["results"][0]
-                    logger.info(f"Migrating package set {target['name']}...")
-
-                    files_to_upload = []
-                    for pkg_name in pset["packages"]:
-                        pkg_path = pset["location"] / pkg_name
-                        files_to_upload.append(
-                            (
-                                "files",
-                                (
-                                    pkg_name,
-                                    pkg_path.read_bytes(),
-                                    get_pms(target["project"]["pms"]).mimetype[0],
-                                ),
-                            )
-                        )
-
-                    encoder = MultipartEncoder(fields=files_to_upload)
-                    patch_resp = self.session.patch(
-                        f"{API_URL}/package-sets/{target['id']}/",
-                        data=encoder,
-                        headers={"Content-Type": encoder.content_type},
+                if patch_resp.status_code == requests.codes.ok:
+                    ok = True
+                    self.journal.mark_done("package_set", pset["location"])
+                    logger.debug(f"Package set {target['name']} migrated successfully.")
+                else:
+                    logger.error(
+                        f"Failed to migrate {target['name']}: {patch_resp.text}"
                     )
-                    if patch_resp.status_code == requests.codes.ok:
-                        logger.info(
-                            f"Package set {target['name']} migrated successfully."
-                        )
-                    else:
-                        logger.error(
-                            f"Failed to migrate {target['name']}: {patch_resp.text}"
-                        )
-            except requests.RequestException as e:
+            except (requests.RequestException, OSError) as e:
                 logger.warning(
                     f"Connectivity issue during package set {pset['name']} migration: {e}"
                 )
+            finally:
+                for handle in handles:
+                    handle.close()
+            progress.update(pset["size"], ok)
+
+        self._run_pool(_migrate, package_sets)
+        return progress.failed
 
     def get_projects(self) -> List[Dict[str, Any]]:
         """Retrieves and paginates projects from the API."""
@@ -352,6 +516,14 @@ if __name__ == "__main__":
     all_projects = migrator.get_projects()
     migrator.update_projects(all_projects)
     migrator.migrate_structure(all_projects)
-    migrator.migrate_packages()
-    migrator.migrate_package_sets()
+    failed = migrator.migrate_packages()
+    failed += migrator.migrate_package_sets()
     migrator.regenerate_metadata()
+
+    if failed:
+        # Keep the journal: a new run only retries what failed
+        logger.warning(f"{failed} items could not be migrated. Run again to retry them.")
+        sys.exit(1)
+
+    # Completed: a later run starts from scratch
+    migrator.journal.remove()
@@ -0,0 +1,140 @@
+"""
+Agent registry in Redis.
+
+Shared with the tunnel relay (build/tunnel), which writes the same keys:
+
+- agent:{id}     JSON agent data (TTL)
+- agents:seen    ZSET agent id -> last-seen timestamp (expiry, count, pagination)
+- agents:names   ZSET (score 0) "name\\0id" members for lexicographic prefix search
+- agents:lex     HASH agent id -> its member in agents:names
+- tunnel:{id}    JSON relay heartbeat (TTL)
+- tunnel:relays  ZSET relay id -> load (active connections)
+"""
+
+import json
+import time
+
+import redis.asyncio as redis
+
+AGENT_TTL = 300  # seconds without heartbeat before an agent is considered gone
+
+AGENTS_SEEN_KEY = "agents:seen"
+AGENTS_NAMES_KEY = "agents:names"
+AGENTS_LEX_KEY = "agents:lex"
+RELAYS_KEY = "tunnel:relays"
+
+PRUNE_BATCH = 1000
+RELAY_CANDIDATES = 10
+
+_LEX_MAX = "\U0010ffff"
+
+
+def _name_member(agent_id: str, name: str | None) -> str:
+    return f"{(name or '').lower()}\x00{agent_id}"
+
+
+async def register_agent(r: redis.Redis, agent_data: dict, ttl: int = AGENT_TTL):
+    """Stores agent data and updates the last-seen and name indexes"""
+    agent_id = str(agent_data["id"])
+    member = _name_member(agent_id, agent_data.get("name"))
+    previous = await r.hget(AGENTS_LEX_KEY, agent_id)
+
+    async with r.pipeline(transaction=False) as pipe:
+        pipe.set(f"agent:{agent_id}", json.dumps(agent_data), ex=ttl)
+        pipe.zadd(AGENTS_SEEN_KEY, {agent_id: time.time()})
+        if previous and previous != member:
+            pipe.zrem(AGENTS_NAMES_KEY, previous)
+        pipe.zadd(AGENTS_NAMES_KEY, {member: 0})
+        pipe.hset(AGENTS_LEX_KEY, agent_id, member)
+        await pipe.execute()
+
+
+async def remove_agents(r: redis.Redis, agent_ids: list[str]):
+    """Removes agents and their index entries"""
+    if not agent_ids:
+        return
+
+    members = [m for m in await r.hmget(AGENTS_LEX_KEY, agent_ids) if m]
+    async with r.pipeline(transaction=False) as pipe:
+        pipe.delete(*[f"agent:{agent_id}" for agent_id in agent_ids])
+        pipe.zrem(AGENTS_SEEN_KEY, *agent_ids)
+        if members:
+            pipe.zrem(AGENTS_NAMES_KEY, *members)
+        pipe.hdel(AGENTS_LEX_KEY, *agent_ids)
+        await pipe.execute()
+
+
+async def prune_expired_agents(r: redis.Redis) -> int:
+    """Drops agents not seen within AGENT_TTL from the indexes"""
+    cutoff = time.time() - AGENT_TTL
+    pruned = 0
+    while True:
+        expired = await r.zrangebyscore(
+            AGENTS_SEEN_KEY, "-inf", cutoff, start=0, num=PRUNE_BATCH
+        )
+        if not expired:
+            return pruned
+        await remove_agents(r, expired)
+        pruned += len(expired)
+
+
+async def list_agents(
+    r: redis.Redis, page: int = 1, limit: int = 2, search: str | None = None
+) -> tuple[list[dict], int]:
+    """
+    Returns (agents, total) for a page.
+    Without search agents are ordered by most recently seen; with search,
+    every agent whose name starts with it (case-insensitive) is matched.
+    """
+    await prune_expired_agents(r)
+
+    page = max(page, 1)
+    limit = max(limit, 1)
+    start = (page - 1) * limit
+
+    if search:
+        prefix = search.lower()
+        low, high = f"[{prefix}", f"[{prefix}{_LEX_MAX}"
+        total = await r.zlexcount(AGENTS_NAMES_KEY, low, high)
+        members = await r.zrangebylex(
+            AGENTS_NAMES_KEY, low, high, start=start, num=limit
+        )
+        agent_ids = [m.rsplit("\x00", 1)[-1] for m in members]
+    else:
+        total = await r.zcard(AGENTS_SEEN_KEY)
+        agent_ids = await r.zrevrange(AGENTS_SEEN_KEY, start, start + limit - 1)
+
+    agents = []
+    if agent_ids:
+        values = await r.mget([f"agent:{agent_id}" for agent_id in agent_ids])
+        agents = [json.loads(value) for value in values if value]
+
+    return agents, total
+
+
+async def select_relay(r: redis.Redis) -> dict | None:
+    """Returns the heartbeat data of the least loaded live relay"""
+    relay_ids = await r.zrange(RELAYS_KEY, 0, RELAY_CANDIDATES - 1)
+    if not relay_ids:
+        return None
+
+    values = await r.mget([f"tunnel:{relay_id}" for relay_id in relay_ids])
+    best = None
+    stale = []
+    for relay_id, value in zip(relay_ids, values):
+        if not value:
+            # Heartbeat expired: relay is gone
+            stale.append(relay_id)
+            continue
+        try:
+            data = json.loads(value)
+        except json.JSONDecodeError:
+            continue
+        if "url" in data:
+            best = data
+            break
+
+    if stale:
+        await r.zrem(RELAYS_KEY, *stale)
+
+    return best
@@ -4,12 +4,15 @@ import socket
 import time
 import requests
 import urllib3
+from requests.adapters import HTTPAdapter
 import os
 import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 import asyncio
 import msgpack
-import websockets
 
 from core.config import (
     SYNC_MAX_DB_LATENCY,
@@ -17,13 +20,12 @@ from core.config import (
     SYNC_MAX_CONCURRENCY,
     SYNC_QUEUE_PROCESS_INTERVAL,
     METRICS_RECORDING_INTERVAL,
-    METRICS_RETENTION_LIMIT,
-    ROOT_PATH,
-    API_VERSION,
     POSTGRES_HOST,
 )
+from core import metrics as metrics_store
 from core.database import get_db_connection
 from core.redis import get_redis_connection
+from core.sync import SyncDispatcher
 
 # Logging configuration
 DEBUG_MODE = os.environ.get("DEBUG", "false").lower() == "true"
@@ -53,9 +55,29 @@ urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 PORTAINER_URL = "http://portainer:9000/api"
 PORTAINER_TOKEN_FILE = "/mnt/cluster/credentials/portainer-token"
 
+PORTAINER_STATS_CONCURRENCY = 16  # Parallel container stats requests
+PORTAINER_STATS_TIMEOUT = 5  # Seconds per container stats request
+
 _portainer_endpoint_id = None
 _portainer_nodes_cache = {"ts": 0, "map": {}}
+_portainer_session = None
 _prev_stats_cache = {}  # {container_id: {'cpu': val, 'system': val}}
+# Collections also run from the status endpoints, concurrently with the metrics thread
+_prev_stats_lock = threading.Lock()
+
+
+def get_portainer_session():
+    """Shared HTTP session with a connection pool sized for stats requests"""
+    global _portainer_session
+    if _portainer_session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=PORTAINER_STATS_CONCURRENCY
+        )
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        _portainer_session = session
+    return _portainer_session
 
 
 def get_portainer_headers():
@@ -78,7 +100,9 @@ def get_portainer_endpoint_id(headers):
 
     try:
         # We look for the primary endpoint. Usually there is only one in this setup or it's named 'primary'
-        resp = requests.get(f"{PORTAINER_URL}/endpoints", headers=headers, timeout=5)
+        resp = get_portainer_session().get(
+            f"{PORTAINER_URL}/endpoints", headers=headers, timeout=5
+        )
         if resp.status_code == 200:
             endpoints = resp.json()
             # Heuristic: pick the first Swarm/Docker endpoint
@@ -92,55 +116,136 @@ def get_portainer_endpoint_id(headers):
     return None
 
 
-def get_service_cpu_load_via_portainer(service_suffix):
+def get_portainer_nodes_map(headers, endpoint_id):
     """
-    Calculate CPU load for containers of a service using Portainer API.
-    Returns a dict: {
+    Map Swarm NodeId -> {'ip', 'hostname'} (cached for 5 minutes).
+    """
+    global _portainer_nodes_cache
+    now = time.time()
+    if now - _portainer_nodes_cache["ts"] < 300:
+        return _portainer_nodes_cache["map"]
+
+    nodes_map = {}
+    try:
+        nodes_resp = get_portainer_session().get(
+            f"{PORTAINER_URL}/endpoints/{endpoint_id}/docker/nodes",
+            headers=headers,
+            timeout=5,
+        )
+        if nodes_resp.status_code == 200:
+            for n in nodes_resp.json():
+                nid = n.get("ID")
+                # 'Addr' is the typically reachable IP of the node in Swarm
+                ip = n.get("Status", {}).get("Addr")
+                # 'Hostname' is the node hostname
+                hostname = n.get("Description", {}).get("Hostname")
+                if nid and ip:
+                    nodes_map[nid] = {"ip": ip, "hostname": hostname}
+            _portainer_nodes_cache = {"ts": now, "map": nodes_map}
+    except Exception as ne:
+        logger.warning(f"Could not fetch Swarm nodes from Portainer: {ne}")
+    return nodes_map
+
+
+def _fetch_container_stats(headers, endpoint_id, cid, node_hostname):
+    """
+    One-shot stats of a container (None on failure). Runs in the collector pool.
+    """
+    # Add target header for cross-node stats proxying
+    stats_headers = headers.copy()
+    if node_hostname:
+        stats_headers["X-PortainerAgent-Target"] = node_hostname
+
+    try:
+        stats_resp = get_portainer_session().get(
+            f"{PORTAINER_URL}/endpoints/{endpoint_id}/docker/containers/{cid}/stats?stream=false",
+            headers=stats_headers,
+            timeout=PORTAINER_STATS_TIMEOUT,
+        )
+        if stats_resp.status_code != 200:
+            return None
+        stats = stats_resp.json()
+    except Exception:
+        return None
+
+    # Resilient check: ensure we have the necessary stats keys
+    if not isinstance(stats, dict) or "cpu_stats" not in stats:
+        return None
+    return stats
+
+
+def _container_cpu_load(cid, stats):
+    """
+    CPU load (%) from the delta with the previous sample of the container.
+    Returns None when there is no previous sample yet.
+    """
+    cpu_usage_data = stats["cpu_stats"].get("cpu_usage", {})
+    cpu_usage = cpu_usage_data.get("total_usage")
+    system_usage = stats["cpu_stats"].get("system_cpu_usage")
+
+    if cpu_usage is None or system_usage is None:
+        return None
+
+    online_cpus = stats["cpu_stats"].get("online_cpus")
+    if not online_cpus:
+        per_cpu = cpu_usage_data.get("percpu_usage")
+        online_cpus = len(per_cpu) if per_cpu else 1
+
+    current_load = None
+    with _prev_stats_lock:
+        prev = _prev_stats_cache.get(cid)
+        if prev:
+            cpu_delta = cpu_usage - prev["cpu"]
+            system_delta = system_usage - prev["system"]
+            if system_delta > 0 and cpu_delta >= 0:
+                current_load = (cpu_delta / system_delta) * online_cpus * 100.0
+
+        _prev_stats_cache[cid] = {"cpu": cpu_usage, "system": system_usage}
+    return current_load
+
+
+def _container_ip(container):
+    # Get Container Internal IP (used by pgpool backends)
+    networks = container.get("NetworkSettings", {}).get("Networks", {})
+    for net_name in ["inv_network", "infra_network"]:
+        if net_name in networks:
+            return networks[net_name].get("IPAddress")
+    if networks:
+        return next(iter(networks.values())).get("IPAddress")
+    return None
+
+
+def collect_services_cpu_load(service_suffixes):
+    """
+    Calculate CPU load for the containers of several services in one pass:
+    one container listing, then concurrent stats requests over a pooled session.
+    Returns ({service_suffix: {
         'avg': float,
         'nodes': {node_ip: load, ...},
         'container_map': {container_ip: {'node_ip': ip, 'node_hostname': host, 'load': l}}
-    }
+    }}, collection duration in seconds)
     """
-    global _prev_stats_cache
-    result = {"avg": 0.0, "nodes": {}, "container_map": {}}
+    results = {
+        suffix: {"avg": 0.0, "nodes": {}, "container_map": {}}
+        for suffix in service_suffixes
+    }
 
     headers = get_portainer_headers()
     if not headers:
-        return result
+        return results, 0.0
     endpoint_id = get_portainer_endpoint_id(headers)
     if not endpoint_id:
-        return result
+        return results, 0.0
 
+    started = time.monotonic()
+    containers = 0
     try:
-        # 1. Fetch Swarm Nodes to map NodeId -> NodeInfo (Cache for 5 minutes)
-        global _portainer_nodes_cache
-        now = time.time()
-        if now - _portainer_nodes_cache["ts"] < 300:
-            nodes_map = _portainer_nodes_cache["map"]
-        else:
-            nodes_map = {}
-            try:
-                nodes_resp = requests.get(
-                    f"{PORTAINER_URL}/endpoints/{endpoint_id}/docker/nodes",
-                    headers=headers,
-                    timeout=5,
-                )
-                if nodes_resp.status_code == 200:
-                    for n in nodes_resp.json():
-                        nid = n.get("ID")
-                        # 'Addr' is the typically reachable IP of the node in Swarm
-                        ip = n.get("Status", {}).get("Addr")
-                        # 'Hostname' is the node hostname
-                        hostname = n.get("Description", {}).get("Hostname")
-                        if nid and ip:
-                            nodes_map[nid] = {"ip": ip, "hostname": hostname}
-                    _portainer_nodes_cache = {"ts": now, "map": nodes_map}
-            except Exception as ne:
-                logger.warning(f"Could not fetch Swarm nodes from Portainer: {ne}")
-
-        # 2. Fetch containers
+        # 1. Map NodeId -> NodeInfo (cached)
+        nodes_map = get_portainer_nodes_map(headers, endpoint_id)
+
+        # 2. Fetch containers of all watched services
         filters = {"label": ["com.docker.swarm.service.name"]}
-        resp = requests.get(
+        resp = get_portainer_session().get(
             f"{PORTAINER_URL}/endpoints/{endpoint_id}/docker/containers/json",
             headers=headers,
             params={"filters": json.dumps(filters), "status": "running"},
@@ -150,115 +255,80 @@ def get_service_cpu_load_via_portainer(service_suffix):
             logger.error(
                 f"Portainer containers list failed: {resp.status_code} {resp.text}"
             )
-            return result
-
-        containers = resp.json()
-        target_containers = []
-        for c in containers:
-            svc_name = c["Labels"].get("com.docker.swarm.service.name", "")
-            if svc_name.endswith(service_suffix):
-                target_containers.append(c)
-
-        if not target_containers:
-            return result
-
-        total_load = 0.0
-        valid_samples = 0
+            return results, time.monotonic() - started
+
+        targets = []  # (suffix, container, node_info)
+        for c in resp.json():
+            labels = c.get("Labels", {})
+            svc_name = labels.get("com.docker.swarm.service.name", "")
+            for suffix in service_suffixes:
+                if svc_name.endswith(suffix):
+                    node_info = nodes_map.get(labels.get("com.docker.swarm.node.id"), {})
+                    targets.append((suffix, c, node_info))
+                    break
 
-        for container in target_containers:
-            cid = container["Id"]
-            labels = container.get("Labels", {})
-            node_id = labels.get("com.docker.swarm.node.id")
+        if not targets:
+            return results, time.monotonic() - started
+
+        # 3. Fetch stats concurrently
+        with ThreadPoolExecutor(
+            max_workers=min(PORTAINER_STATS_CONCURRENCY, len(targets))
+        ) as pool:
+            all_stats = list(
+                pool.map(
+                    lambda t: _fetch_container_stats(
+                        headers, endpoint_id, t[1]["Id"], t[2].get("hostname")
+                    ),
+                    targets,
+                )
+            )
 
-            # Map container to a Swarm Node
-            node_info = nodes_map.get(node_id, {})
+        # 4. Compute loads
+        totals = {suffix: [0.0, 0] for suffix in service_suffixes}
+        for (suffix, container, node_info), stats in zip(targets, all_stats):
+            result = results[suffix]
             node_ip = node_info.get("ip")
             node_hostname = node_info.get("hostname")
+            container_ip = _container_ip(container)
+
+            current_load = None
+            if stats is not None:
+                current_load = _container_cpu_load(container["Id"], stats)
+                if current_load is not None:
+                    totals[suffix][0] += current_load
+                    totals[suffix][1] += 1
+                    if node_ip:
+                        # Store the CPU load associated with the Swarm Node IP
+                        result["nodes"][node_ip] = current_load
+
+            # IMPORTANT: Map the container to the node even if we don't have CPU stats yet
+            if container_ip:
+                result["container_map"][container_ip] = {
+                    "node_ip": node_ip,
+                    "node_hostname": node_hostname,
+                    "load": current_load,
+                }
+
+        for suffix, (total_load, valid_samples) in totals.items():
+            if valid_samples > 0:
+                results[suffix]["avg"] = total_load / valid_samples
+
+        containers = len(targets)
 
-            # Get Container Internal IP (used by pgpool backends)
-            container_ip = None
-            networks = container.get("NetworkSettings", {}).get("Networks", {})
-            for net_name in ["inv_network", "infra_network"]:
-                if net_name in networks:
-                    container_ip = networks[net_name].get("IPAddress")
-                    break
-            if not container_ip and networks:
-                container_ip = next(iter(networks.values())).get("IPAddress")
-
-            try:
-                # Add target header for cross-node stats proxying
-                stats_headers = headers.copy()
-                if node_hostname:
-                    stats_headers["X-PortainerAgent-Target"] = node_hostname
-
-                stats_resp = requests.get(
-                    f"{PORTAINER_URL}/endpoints/{endpoint_id}/docker/containers/{cid}/stats?stream=false",
-                    headers=stats_headers,
-                    timeout=5,
-                )
-                if stats_resp.status_code != 200:
-                    continue
-
-                stats = stats_resp.json()
-
-                # Resilient check: ensure we have the necessary stats keys
-                if not isinstance(stats, dict) or "cpu_stats" not in stats:
-                    continue
-
-                cpu_usage_data = stats["cpu_stats"].get("cpu_usage", {})
-                cpu_usage = cpu_usage_data.get("total_usage")
-                system_usage = stats["cpu_stats"].get("system_cpu_usage")
-
-                if cpu_usage is None or system_usage is None:
-                    continue
-
-                online_cpus = stats["cpu_stats"].get("online_cpus")
-                if not online_cpus:
-                    per_cpu = cpu_usage_data.get("percpu_usage")
-                    online_cpus = len(per_cpu) if per_cpu else 1
-
-                if cid in _prev_stats_cache:
-                    prev = _prev_stats_cache[cid]
-                    cpu_delta = cpu_usage - prev["cpu"]
-                    system_delta = system_usage - prev["system"]
-
-                    if system_delta > 0 and cpu_delta >= 0:
-                        current_load = (cpu_delta / system_delta) * online_cpus * 100.0
-                        total_load += current_load
-                        valid_samples += 1
-
-                        if node_ip:
-                            # Store the CPU load associated with the Swarm Node IP
-                            result["nodes"][node_ip] = current_load
-                else:
-                    current_load = None
-
-                # IMPORTANT: Map the container to the node even if we don't have CPU stats yet
-                if container_ip:
-                    result["container_map"][container_ip] = {
-                        "node_ip": node_ip,
-                        "node_hostname": node_hostname,
-                        "load": current_load,
-                    }
-
-                _prev_stats_cache[cid] = {"cpu": cpu_usage, "system": system_usage}
-            except Exception:
-                # If stats fail, still try to populate basic mapping if we haven't already
-                if container_ip and container_ip not in result["container_map"]:
-                    result["container_map"][container_ip] = {
-                        "node_ip": node_ip,
-                        "node_hostname": node_hostname,
-                        "load": None,
-                    }
-                continue
+    except Exception as e:
+        logger.error(f"Error calculating stats via Portainer for {service_suffixes}: {e}")
 
-        if valid_samples > 0:
-            result["avg"] = total_load / valid_samples
+    duration = time.monotonic() - started
+    logger.debug(f"Portainer stats collected for {containers} containers in {duration:.2f}s")
+    return results, duration
 
-    except Exception as e:
-        logger.error(f"Error calculating stats via Portainer for {service_suffix}: {e}")
 
-    return result
+def get_service_cpu_load_via_portainer(service_suffix):
+    """
+    Calculate CPU load for containers of a service using Portainer API.
+    """
+    results, _ = collect_services_cpu_load([service_suffix])
+    return results[service_suffix]
 
 
 def get_saturation_metrics():
@@ -282,6 +352,7 @@ def get_saturation_metrics():
             "core_cpu": float(data.get("core_cpu", 0)),
             "db_cpu": float(data.get("db_cpu", 0)),
             "queued": int(data.get("queued", 0)),
+            "collect_duration": float(data.get("collect_duration", 0)),
             "cluster_nodes": json.loads(data.get("cluster_nodes", "[]")),
             "is_pgpool": host_value == "pgpool",
         }
@@ -331,7 +402,6 @@ def refresh_server_metrics():
     """
     Calculate metrics, update current state, and append to history.
     """
-    history_key = "manager:metric:history"
     key = "manager:metric:actual"
 
     # 0. Get previous metrics to calculate rates
@@ -355,12 +425,13 @@ def refresh_server_metrics():
     except Exception:
         db_latency = 999.0
 
-    # 2. Check Swarm CPU Load (Distributed via Portainer)
-    core_stats = get_service_cpu_load_via_portainer("_core")
+    # 2. Check Swarm CPU Load of core and database (Distributed via Portainer)
+    services_stats, collect_duration = collect_services_cpu_load(["_core", "_database"])
+    core_stats = services_stats["_core"]
     load_percentage = core_stats.get("avg", 0.0)
 
-    # 3. Check Database CPU Load (Distributed via Portainer)
-    db_stats = get_service_cpu_load_via_portainer("_database")
+    # 3. Database CPU Load
+    db_stats = services_stats["_database"]
     db_load_percentage = db_stats.get("avg", 0.0)
     db_container_map = db_stats.get("container_map", {})
 
@@ -497,29 +568,24 @@ def refresh_server_metrics():
             "db_latency": db_latency,
             "core_cpu": load_percentage,
             "db_cpu": db_load_percentage,
+            "collect_duration": collect_duration,
             "cluster_nodes": json.dumps(cluster_nodes),
         },
     )
 
-    # 7. Add to history (ZSET)
-    history_entry = {
-        "ts": now_ts,
-        "saturated": 1 if saturated else 0,
-        "db_latency": db_latency,
-        "core_cpu": load_percentage,
-        "db_cpu": db_load_percentage,
-        "attempts": sync_attempts,
-        "cluster_nodes": cluster_nodes,  # Store as list in history
-    }
-
-    pipe = con.pipeline()
-    pipe.zadd(history_key, {json.dumps(history_entry): now_ts})
-
-    # Trim history (keep last 4 hours)
-    retention_limit = now_ts - METRICS_RETENTION_LIMIT
-    pipe.zremrangebyscore(history_key, "-inf", retention_limit)
-
-    pipe.execute()
+    # 7. Add to history (tiered store, rollups and trimming included)
+    # Cluster nodes are only kept in the current state
+    metrics_store.record_sample(
+        {
+            "ts": now_ts,
+            "saturated": 1 if saturated else 0,
+            "db_latency": db_latency,
+            "core_cpu": load_percentage,
+            "db_cpu": db_load_percentage,
+            "attempts": sync_attempts,
+        },
+        con=con,
+    )
 
 
 def get_database_backends():
@@ -572,7 +638,7 @@ def get_swarm_topology():
 
     try:
         # Fetch ALL Swarm Nodes
-        nodes_resp = requests.get(
+        nodes_resp = get_portainer_session().get(
             f"{PORTAINER_URL}/endpoints/{endpoint_id}/docker/nodes",
             headers=headers,
             timeout=5,
@@ -602,28 +668,22 @@ def get_swarm_topology():
     return topology
 
 
-def get_metrics_from_history(limit=1000):
+def get_metrics_from_history(limit=1000, start=None, end=None, step=None, since=None):
     """
-    Get historical metrics from Redis.
-    Returns a list of dicts.
+    Get historical metrics from the tiered store.
+    Returns (tier, list of dicts):
+    - since: raw samples newer than that timestamp (incremental polling)
+    - start/end/step: range query, served from the best fitting tier
+    - otherwise: the last 'limit' raw samples
     """
-    con = get_redis_connection()
-    history_key = "manager:metric:history"
+    if since is not None:
+        return "raw", metrics_store.query_since(since, limit=limit)
 
-    # Get all elements (we rely on trimming to keep size manageable)
-    # or just last 'limit'
-    items = con.zrange(history_key, 0, -1)
-
-    result = []
-    for item in items:
-        if isinstance(item, bytes):
-            item = item.decode("utf-8")
-        try:
-            result.append(json.loads(item))
-        except json.JSONDecodeError:
-            pass
+    if start is not None:
+        end = end if end is not None else time.time()
+        return metrics_store.query_range(start, end, step=step)
 
-    return result
+    return "raw", metrics_store.query_latest(limit=limit)
 
 
 def _send_to_group(group_name, payload):
@@ -664,135 +724,149 @@ def _send_to_group(group_name, payload):
     pipe.execute()
 
 
-def process_sync_queue():
-    """
-    Process the sync queue with adaptive concurrency.
-    """
-    metrics = get_saturation_metrics()
-    if metrics["saturated"]:
-        return
-
-    try:
-        con = get_redis_connection()
-        limit = SYNC_MAX_CONCURRENCY
-        max_load = SYNC_MAX_CORE_LOAD
-
-        # Adaptive Batch Sizing
-        current_load = metrics["core_cpu"]
-        utilization_ratio = current_load / max_load if max_load > 0 else 1.0
-        capacity_factor = 1.0 - utilization_ratio
-        capacity_factor = max(0.0, min(1.0, capacity_factor))
-
-        batch_size = int(limit * capacity_factor)
-        batch_size = max(1, batch_size) if capacity_factor > 0.05 else 0
-
-        if batch_size > 0:
-            logger.debug(
-                f"Sync Queue: Processing {batch_size} clients (Load: {current_load:.1f}%)"
-            )
+CID_CACHE_SIZE = 100000
+CID_CACHE_TTL = 3600  # seconds: re-registered or merged computers get a new id
 
-        cids_to_sync = []
-        count = 0
-        while count < batch_size:
-            uuid = con.lpop("manager:sync_queue")
-            if not uuid:
-                break
+_cid_cache = OrderedDict()  # {uuid: (cid, expires)}, bounded LRU
+_sync_dispatcher = None
 
-            if isinstance(uuid, bytes):
-                uuid = uuid.decode("utf-8")
 
-            cid = get_cid_from_uuid(uuid)
+def get_sync_batch_size(metrics):
+    """
+    Adaptive batch sizing based on core CPU load.
+    """
+    limit = SYNC_MAX_CONCURRENCY
+    max_load = SYNC_MAX_CORE_LOAD
 
-            if cid:
-                cids_to_sync.append(cid)
-            else:
-                logger.warning(f"Could not resolve CID for UUID: {uuid}")
+    current_load = metrics["core_cpu"]
+    utilization_ratio = current_load / max_load if max_load > 0 else 1.0
+    capacity_factor = 1.0 - utilization_ratio
+    capacity_factor = max(0.0, min(1.0, capacity_factor))
 
-            count += 1
+    batch_size = int(limit * capacity_factor)
+    return max(1, batch_size) if capacity_factor > 0.05 else 0
 
-        if cids_to_sync:
-            try:
-                logger.info(
-                    f"Triggering sync for {len(cids_to_sync)} clients in parallel"
-                )
-                asyncio.run(trigger_batch_sync(cids_to_sync))
-            except Exception as e:
-                logger.error(f"Error triggering batch sync: {e}")
 
-    except Exception as e:
-        logger.error(f"Error processing sync queue: {e}")
+def pop_sync_batch(batch_size):
+    """
+    Pops up to batch_size UUIDs from the sync queue in one call (duplicates removed).
+    """
+    con = get_redis_connection()
+    items = con.lpop("manager:sync_queue", batch_size) or []
+    uuids = (i.decode("utf-8") if isinstance(i, bytes) else i for i in items)
+    return list(dict.fromkeys(uuids))
 
 
-async def trigger_batch_sync(cids):
+def get_cids_from_uuids(uuids):
     """
-    Triggers sync for a list of CIDs in parallel.
+    Resolves Computer IDs (CID) from UUIDs: {uuid: cid}.
+    Cached UUIDs are not queried again; the rest are resolved in one query.
     """
-    tasks = [trigger_sync_via_websocket(cid) for cid in cids]
-    results = await asyncio.gather(*tasks, return_exceptions=True)
-
-    for cid, result in zip(cids, results):
-        if isinstance(result, Exception):
-            logger.error(f"Error triggering sync for CID {cid}: {result}")
+    result = {}
+    missing = []
+    now = time.monotonic()
+    for uuid in uuids:
+        cid, expires = _cid_cache.get(uuid, (None, 0))
+        if cid is None or expires < now:
+            missing.append(uuid)
         else:
-            logger.info(f"Sync triggered for CID {cid} via WebSocket")
+            _cid_cache.move_to_end(uuid)
+            result[uuid] = cid
 
+    if missing:
+        try:
+            with get_db_connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute(
+                        "SELECT uuid, id FROM public.client_computer WHERE uuid = ANY(%s)",
+                        (missing,),
+                    )
+                    for uuid, cid in cursor.fetchall():
+                        result[uuid] = cid
+                        _cid_cache[uuid] = (cid, now + CID_CACHE_TTL)
+                        _cid_cache.move_to_end(uuid)
+        except Exception as e:
+            logger.error(f"Error getting CIDs from {len(missing)} UUIDs: {e}")
 
-async def trigger_sync_via_websocket(cid):
-    """
-    Connects to the tunnel WebSocket as an admin and executes 'migasfree sync'.
-    """
-    url = f"ws://127.0.0.1:8080{ROOT_PATH}{API_VERSION}/private/tunnel/ws/agents/{cid}?service=exec"
+        while len(_cid_cache) > CID_CACHE_SIZE:
+            _cid_cache.popitem(last=False)
 
-    # We must provide the generic Admin CN to pass the check in tunnels.py
-    headers = {"X-SSL-Client-CN": "CN=manager,OU=ADMINS,O=migasfree,C=ES"}
+    return result
 
-    async with websockets.connect(url, additional_headers=headers) as ws:
-        logger.debug(f"Connected to WebSocket: {url}")
 
-        # Send execute command
-        # "type": "execute_command", "command": "migasfree sync"
-        payload = {"type": "execute_command", "command": "migasfree sync"}
-        await ws.send(json.dumps(payload))
-        logger.debug(f"Sent command payload to {cid}")
+def forget_cids(uuids):
+    """Drops UUIDs from the CID cache (e.g. their cached id has no agent)"""
+    for uuid in uuids:
+        _cid_cache.pop(uuid, None)
 
-        # Wait for completion or timeout
-        # We expect a "command_complete" or "command_error" message
-        try:
-            async for message in ws:
-                msg = json.loads(message)
-                logger.debug(f"Received WS message from {cid}: {msg}")
-                if msg.get("type") == "command_complete":
-                    return True
-                elif msg.get("type") == "command_error":
-                    raise Exception(f"Command Error: {msg.get('error')}")
-                # We can ignore 'output' messages unless we want to log them
-        except Exception as e:
-            # If connection closes we might get here
-            raise e
+
+def get_agents_data(cids):
+    """
+    Gets tunnel agent data for a list of CIDs in one call: {cid: data}.
+    """
+    con = get_redis_connection()
+    values = con.mget([f"agent:{cid}" for cid in cids])
+    return {cid: json.loads(value) for cid, value in zip(cids, values) if value}
 
 
-def get_cid_from_uuid(uuid):
+async def process_sync_queue():
     """
-    Get Computer ID (CID) from UUID.
+    Process the sync queue with adaptive concurrency.
     """
+    metrics = await asyncio.to_thread(get_saturation_metrics)
+    if metrics["saturated"]:
+        return
+
     try:
-        with get_db_connection() as conn:
-            with conn.cursor() as cursor:
-                cursor.execute(
-                    "SELECT id FROM public.client_computer WHERE uuid = %s", (uuid,)
-                )
-                res = cursor.fetchone()
-                if res:
-                    return res[0]
+        # Syncs still running from previous ticks use part of the budget
+        batch_size = min(get_sync_batch_size(metrics), _sync_dispatcher.available())
+        if batch_size <= 0:
+            return
+
+        logger.debug(
+            f"Sync Queue: Processing {batch_size} clients (Load: {metrics['core_cpu']:.1f}%)"
+        )
+
+        uuids = await asyncio.to_thread(pop_sync_batch, batch_size)
+        if not uuids:
+            return
+
+        cids = await asyncio.to_thread(get_cids_from_uuids, uuids)
+        for uuid in uuids:
+            if uuid not in cids:
+                logger.warning(f"Could not resolve CID for UUID: {uuid}")
+        if not cids:
+            return
+
+        agents = await asyncio.to_thread(get_agents_data, list(cids.values()))
+
+        logger.info(f"Triggering sync for {len(cids)} clients in parallel")
+        stale = []
+        for uuid, cid in cids.items():
+            agent_data = agents.get(cid)
+            if agent_data is None:
+                logger.error(f"Error triggering sync for CID {cid}: Agent not found")
+                # The computer may have a new id: resolve it again next time
+                stale.append(uuid)
+                continue
+            _sync_dispatcher.dispatch(cid, agent_data)
+        forget_cids(stale)
+
     except Exception as e:
-        logger.error(f"Error getting CID from UUID {uuid}: {e}")
-    return None
+        logger.error(f"Error processing sync queue: {e}")
 
 
 _background_tasks = []
 
 
 async def _metrics_loop():
+    try:
+        converted = await asyncio.to_thread(metrics_store.migrate_legacy_history)
+        if converted:
+            logger.info(f"Converted {converted} legacy metrics samples to the tiered store")
+    except Exception as e:
+        logger.warning(f"Could not convert legacy metrics history: {e}")
+
     while True:
         try:
             # Run blocking I/O in executor
@@ -806,8 +880,7 @@ async def _metrics_loop():
 async def _queue_loop():
     while True:
         try:
-            loop = asyncio.get_running_loop()
-            await loop.run_in_executor(None, process_sync_queue)
+            await process_sync_queue()
         except Exception as e:
             logger.error(f"Error in queue loop: {e}")
         await asyncio.sleep(SYNC_QUEUE_PROCESS_INTERVAL)
@@ -815,8 +888,9 @@ async def _queue_loop():
 
 def start_recording():
     """Starts background tasks (metrics and queue processing)"""
-    global _background_tasks
+    global _background_tasks, _sync_dispatcher
     if not _background_tasks:
+        _sync_dispatcher = SyncDispatcher(SYNC_MAX_CONCURRENCY)
         _background_tasks.append(asyncio.create_task(_metrics_loop()))
         _background_tasks.append(asyncio.create_task(_queue_loop()))
         logger.info("Started background tasks")
@@ -832,4 +906,6 @@ async def stop_recording():
         except asyncio.CancelledError:
             pass
     _background_tasks = []
+    if _sync_dispatcher:
+        await _sync_dispatcher.close()
     logger.info("Stopped background tasks")
@@ -0,0 +1,137 @@
+import asyncio
+import json
+import time
+from collections import deque
+from itertools import count
+
+from sse_starlette.sse import ServerSentEvent
+
+LOG_BACKLOG = 100  # Pending log events kept per subscriber (oldest dropped)
+
+
+def render_event(event: str, data) -> bytes:
+    """Serializes an SSE event once, ready to be written to any client"""
+    return ServerSentEvent(data=json.dumps(data), event=event).encode()
+
+
+class Subscriber:
+    """
+    Pending events of one SSE client.
+    Status events are coalesced per key (latest wins), so a slow client
+    catches up with the current state instead of being dropped.
+    """
+
+    def __init__(self, subscriber_id: int):
+        self.id = subscriber_id
+        self.statuses: dict[str, bytes] = {}
+        self.logs: deque[bytes] = deque(maxlen=LOG_BACKLOG)
+        self.pending_since = None  # Monotonic time of the oldest undelivered event
+        self.coalesced = 0
+        self.dropped = 0
+        self._ready = asyncio.Event()
+
+    def push(self, frame: bytes, key: str | None = None):
+        if key is None:
+            if len(self.logs) == self.logs.maxlen:
+                self.dropped += 1
+            self.logs.append(frame)
+        else:
+            if key in self.statuses:
+                self.coalesced += 1
+            self.statuses[key] = frame
+
+        if self.pending_since is None:
+            self.pending_since = time.monotonic()
+        self._ready.set()
+
+    def pending(self) -> int:
+        return len(self.statuses) + len(self.logs)
+
+    def lag(self) -> float:
+        if self.pending_since is None:
+            return 0.0
+        return time.monotonic() - self.pending_since
+
+    def drain(self) -> bytes:
+        """Returns every pending event as one chunk"""
+        frames = list(self.statuses.values())
+        frames.extend(self.logs)
+        self.statuses.clear()
+        self.logs.clear()
+        self.pending_since = None
+        self._ready.clear()
+        return b"".join(frames)
+
+    async def wait(self, timeout: float) -> bool:
+        """Waits for pending events; False on timeout"""
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+class BroadcastHub:
+    """
+    SSE fan-out: every event is rendered once and the same bytes are queued
+    for all subscribers. The latest status per key is kept as a pre-rendered,
+    versioned snapshot for newly connected clients.
+    """
+
+    def __init__(self):
+        self.subscribers: dict[int, Subscriber] = {}
+        self.version = 0
+        self.published = 0
+        self._ids = count()
+        self._snapshot_frames: dict[str, bytes] = {}
+        self._snapshot = (-1, b"")
+        self._init_frame = render_event("status", {"init": True})
+
+    def publish(self, event: str, data, key: str | None = None):
+        """
+        Renders and queues an event for every subscriber.
+        Events with a key are coalescible and update the snapshot
+        (data None removes the key from it).
+        """
+        frame = render_event(event, data)
+        self.published += 1
+
+        if key is not None:
+            if data is None or data.get("status") is None:
+                self._snapshot_frames.pop(key, None)
+            else:
+                self._snapshot_frames[key] = frame
+            self.version += 1
+
+        for subscriber in self.subscribers.values():
+            subscriber.push(frame, key)
+
+    def snapshot(self) -> tuple[int, bytes]:
+        """Returns (version, rendered initial state), re-rendered only on change"""
+        if self._snapshot[0] != self.version:
+            body = b"".join(self._snapshot_frames.values()) + self._init_frame
+            self._snapshot = (self.version, body)
+        return self._snapshot
+
+    def subscribe(self) -> tuple[Subscriber, bytes]:
+        """Registers a subscriber and returns it with the initial state to send"""
+        subscriber = Subscriber(next(self._ids))
+        # No await in between: no event can be missed or sent twice
+        _, initial = self.snapshot()
+        self.subscribers[subscriber.id] = subscriber
+        return subscriber, initial
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self.subscribers.pop(subscriber.id, None)
+
+    def stats(self) -> dict:
+        subscribers = list(self.subscribers.values())
+        return {
+            "subscribers": len(subscribers),
+            "snapshot_version": self.version,
+            "events_published": self.published,
+            "max_pending": max((s.pending() for s in subscribers), default=0),
+            "max_lag_ms": round(max((s.lag() for s in subscribers), default=0.0) * 1000, 1),
+            "coalesced": sum(s.coalesced for s in subscribers),
+            "dropped_logs": sum(s.dropped for s in subscribers),
+        }
@@ -0,0 +1,205 @@
+"""
+Tiered time-series store for manager metrics in Redis.
+
+Samples are kept in one ZSET per tier (score = timestamp) with a compact
+"ts|saturated|db_latency|core_cpu|db_cpu|attempts" member encoding:
+
+- raw:  every recorded sample, kept METRICS_RETENTION_LIMIT seconds
+- 1m:   1 minute averages of raw, kept 2 days
+- 15m:  15 minute averages of 1m, kept 30 days
+
+A tier bucket is rolled up when the first sample of the next bucket arrives.
+"""
+
+import json
+import math
+import time
+
+from core.config import METRICS_RETENTION_LIMIT
+from core.redis import get_redis_connection
+
+SERIES_PREFIX = "manager:metric:series:"
+ROLLUP_KEY = "manager:metric:series:rollup"  # HASH tier -> last bucket seen
+LEGACY_HISTORY_KEY = "manager:metric:history"  # JSON samples, before the tiered store
+SAMPLE_FIELDS = ("ts", "saturated", "db_latency", "core_cpu", "db_cpu", "attempts")
+
+# (name, bucket seconds, retention seconds, source tier)
+TIERS = (
+    ("raw", 0, METRICS_RETENTION_LIMIT, None),
+    ("1m", 60, 2 * 86400, "raw"),
+    ("15m", 900, 30 * 86400, "1m"),
+)
+
+
+def _key(tier):
+    return f"{SERIES_PREFIX}{tier}"
+
+
+def encode_sample(sample):
+    return (
+        f"{sample['ts']:.3f}|{int(sample['saturated'])}|{sample['db_latency']:.4f}|"
+        f"{sample['core_cpu']:.2f}|{sample['db_cpu']:.2f}|{int(sample['attempts'])}"
+    )
+
+
+def decode_sample(member):
+    if isinstance(member, bytes):
+        member = member.decode("utf-8")
+    ts, saturated, db_latency, core_cpu, db_cpu, attempts = member.split("|")
+    return {
+        "ts": float(ts),
+        "saturated": int(saturated),
+        "db_latency": float(db_latency),
+        "core_cpu": float(core_cpu),
+        "db_cpu": float(db_cpu),
+        "attempts": int(attempts),
+    }
+
+
+def aggregate(samples, ts):
+    """Average of gauges, saturated if any sample was, mean attempts"""
+    count = len(samples)
+    return {
+        "ts": ts,
+        "saturated": max(s["saturated"] for s in samples),
+        "db_latency": sum(s["db_latency"] for s in samples) / count,
+        "core_cpu": sum(s["core_cpu"] for s in samples) / count,
+        "db_cpu": sum(s["db_cpu"] for s in samples) / count,
+        "attempts": round(sum(s["attempts"] for s in samples) / count),
+    }
+
+
+def downsample(samples, step):
+    """Groups ordered samples in buckets of step seconds"""
+    result = []
+    bucket_ts = None
+    bucket = []
+    for sample in samples:
+        ts = math.floor(sample["ts"] / step) * step
+        if ts != bucket_ts and bucket:
+            result.append(aggregate(bucket, bucket_ts))
+            bucket = []
+        bucket_ts = ts
+        bucket.append(sample)
+    if bucket:
+        result.append(aggregate(bucket, bucket_ts))
+    return result
+
+
+def record_sample(sample, con=None):
+    """Appends a sample to the raw tier, rolls up completed buckets and trims"""
+    if con is None:
+        con = get_redis_connection()
+
+    # Scored with the encoded (rounded) ts, so query_since(last decoded ts) is exclusive
+    ts = round(sample["ts"], 3)
+    last_buckets = con.hgetall(ROLLUP_KEY)
+    con.zadd(_key("raw"), {encode_sample({**sample, "ts": ts}): ts})
+
+    # Tiers in order: each rollup reads the tier written just before it
+    for tier, step, retention, source in TIERS:
+        pipe = con.pipeline()
+        pipe.zremrangebyscore(_key(tier), "-inf", ts - retention)
+
+        if step:
+            bucket = math.floor(ts / step) * step
+            last = last_buckets.get(tier)
+            last = float(last) if last is not None else None
+            if last is not None and last < bucket:
+                # Previous bucket is complete: roll it up from the source tier
+                members = con.zrangebyscore(_key(source), last, f"({last + step}")
+                if members:
+                    rolled = aggregate([decode_sample(m) for m in members], last)
+                    pipe.zadd(_key(tier), {encode_sample(rolled): last})
+            if last != bucket:
+                pipe.hset(ROLLUP_KEY, tier, bucket)
+
+        pipe.execute()
+
+
+def _select_tier(start, step):
+    """Coarsest tier still covering start whose bucket is not wider than step"""
+    now = time.time()
+    covering = [t for t in TIERS if start >= now - t[2]] or [TIERS[-1]]
+    if step:
+        fitting = [t for t in covering if t[1] <= step]
+        return fitting[-1] if fitting else covering[0]
+    return covering[0]
+
+
+def query_range(start, end, step=None, con=None):
+    """
+    Returns (tier, samples) between start and end (timestamps), optionally
+    downsampled to step seconds.
+    """
+    if con is None:
+        con = get_redis_connection()
+
+    tier, tier_step, _, _ = _select_tier(start, step)
+    members = con.zrangebyscore(_key(tier), start, end)
+    samples = [decode_sample(m) for m in members]
+    if step and step > tier_step:
+        samples = downsample(samples, step)
+    return tier, samples
+
+
+def query_since(since, limit=1000, con=None):
+    """Raw samples newer than since (exclusive), oldest first"""
+    if con is None:
+        con = get_redis_connection()
+
+    members = con.zrangebyscore(_key("raw"), f"({since}", "+inf", start=0, num=limit)
+    return [decode_sample(m) for m in members]
+
+
+def query_latest(limit=1000, con=None):
+    """Last limit raw samples, oldest first"""
+    if con is None:
+        con = get_redis_connection()
+
+    members = con.zrevrange(_key("raw"), 0, limit - 1)
+    return [decode_sample(m) for m in reversed(members)]
+
+
+def migrate_legacy_history(con=None):
+    """
+    Moves the JSON history ZSET used before the tiered store into the raw
+    tier, pre-computing the rollups of its complete buckets, then removes it.
+    Returns the number of samples converted.
+    """
+    if con is None:
+        con = get_redis_connection()
+
+    samples = []
+    for item in con.zrangebyscore(LEGACY_HISTORY_KEY, time.time() - METRICS_RETENTION_LIMIT, "+inf"):
+        try:
+            entry = json.loads(item)
+            samples.append({field: entry[field] for field in SAMPLE_FIELDS})
+        except (ValueError, KeyError, TypeError):
+            continue  # Malformed entry: nothing to keep
+
+    if samples:
+        for sample in samples:
+            sample["ts"] = round(sample["ts"], 3)
+        last_ts = samples[-1]["ts"]
+        last_buckets = con.hgetall(ROLLUP_KEY)
+
+        pipe = con.pipeline()
+        pipe.zadd(_key("raw"), {encode_sample(s): s["ts"] for s in samples})
+
+        # Rollups of the buckets already complete; the bucket in progress is
+        # rolled up by record_sample as usual. Skipped if the tier is in use.
+        source = samples
+        for tier, step, _, _ in TIERS[1:]:
+            if tier in last_buckets:
+                break
+            current = math.floor(last_ts / step) * step
+            source = [b for b in downsample(source, step) if b["ts"] < current]
+            if source:
+                pipe.zadd(_key(tier), {encode_sample(b): b["ts"] for b in source})
+            pipe.hset(ROLLUP_KEY, tier, current)
+
+        pipe.execute()
+
+    con.unlink(LEGACY_HISTORY_KEY)
+    return len(samples)
@@ -2,8 +2,10 @@ import json
 import logging
 import shutil
 import subprocess
+import threading
 import time
 import uuid
+from contextlib import contextmanager
 from datetime import datetime, timezone
 from pathlib import Path
 from hashlib import sha256
@@ -20,6 +22,7 @@ from core.config import (
     STACK,
     MGI_POOL_DIR,
     MGI_TEMP_DIR,
+    MGI_BUILD_WORKERS,
     CORE_TOKEN_URL,
     PATH_DATASHARES,
     get_dns_servers,
@@ -145,6 +148,11 @@ def _ensure_builder_certificate(project_id: int) -> tuple[Path, Path]:
 MGI_QUEUE_KEY = "mgi:build_queue"
 MGI_TASK_PREFIX = "mgi:task:"
 
+_catalog_lock = threading.Lock()
+# All workers share the builder computer identity (project and tags), so
+# registering it and building the Docker image is done one flavour at a time
+_builder_lock = threading.Lock()
+
 
 TEMPLATE_DIR = Path("/usr/share/manager/templates")
 MPI_TEMPLATE = "mpi.Dockerfile.j2"
@@ -282,23 +290,34 @@ def _update_build_record(build_id: int, status: str, uri: str = None, size: int
     return _patch_core_resource(f"/token/mgi/build/{build_id}/", data)
 
 
-def _update_task_status(task_id: str, status: str, progress: int = 0, message: str = ""):
+def _update_task_status(
+    task_id: str, status: str, progress: int = 0, message: str = "", timings: dict | None = None
+):
     con = get_redis_connection()
     key = f"{MGI_TASK_PREFIX}{task_id}"
-    con.hset(
-        key,
-        mapping={
-            "status": status,
-            "progress": str(progress),
-            "message": message,
-            "updated_at": datetime.now(timezone.utc).isoformat(),
-        },
-    )
+    mapping = {
+        "status": status,
+        "progress": str(progress),
+        "message": message,
+        "updated_at": datetime.now(timezone.utc).isoformat(),
+    }
+    if timings is not None:
+        mapping["timings"] = json.dumps(timings)
+    con.hset(key, mapping=mapping)
     con.expire(key, 86400)
     if message:
         append_task_log(MGI_TASK_PREFIX, task_id, f"[STATUS] {status} ({progress}%): {message}")
 
 
+@contextmanager
+def _timed(timings: dict, stage: str):
+    """Adds the seconds spent in the block to timings[stage]"""
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        timings[stage] = round(timings.get(stage, 0) + time.monotonic() - start, 2)
+
 
 def generate_dockerfile(
     project_data: dict, config_data: dict, flavour_data: dict, release_data: dict, build_dir: Path
@@ -553,11 +572,9 @@ def _create_ext4_image_from_dir(source_dir: Path, output_path: Path, headroom_mb
     src_mb = int(du.stdout.split()[0]) if du.returncode == 0 else 64
     size_mb = max(int(src_mb * 1.2) + headroom_mb, 64)
 
-    subprocess.run(
-        ["dd", "if=/dev/zero", f"of={output_path}", "bs=1M", f"count={size_mb}"],
-        capture_output=True,
-        text=True,
-    )
+    # Sparse file: blocks are only allocated as mkfs.ext4 writes them
+    with open(output_path, "wb") as f:
+        f.truncate(size_mb * 1024 * 1024)
     result = subprocess.run(
         ["mkfs.ext4", "-F", "-d", str(source_dir), str(output_path)],
         capture_output=True,
@@ -636,6 +653,12 @@ def generate_checksums(output_dir: Path, config_data: dict) -> Path:
 
 
 def update_catalog_json(mpi_name: str, flavour_data: dict, build_id: int = None) -> None:
+    # Workers finishing at the same time must not overwrite each other's entries
+    with _catalog_lock:
+        _update_catalog_json(mpi_name, flavour_data, build_id)
+
+
+def _update_catalog_json(mpi_name: str, flavour_data: dict, build_id: int = None) -> None:
     catalog_path = MGI_POOL_DIR / "catalog.json"
     catalog = []
     if catalog_path.exists():
@@ -742,16 +765,20 @@ def build_mgi_image(task_id: str, release_id: int):
         _update_task_status(task_id, "error", 0, "No flavours found for project")
         return
 
+    # Seconds spent in each build stage, per MPI
+    task_timings = {}
+
     try:
         for i, flavour in enumerate(flavours_data):
             base_pct = int((i / num_flavours) * 100)
             flavour_span = 100 / num_flavours
 
             mpi_name = f"{project_data.get('name', slug)}-{release_data['name']}-{flavour['name']}".lower()
+            timings = task_timings[mpi_name] = {}
 
             def _flavour_progress(pct, msg):
                 actual_pct = base_pct + int((pct / 100) * flavour_span)
-                _update_task_status(task_id, "building MPI", actual_pct, f"[{mpi_name}] {msg}")
+                _update_task_status(task_id, "building MPI", actual_pct, f"[{mpi_name}] {msg}", timings=task_timings)
 
             build_dir = MGI_TEMP_DIR / f"{mpi_name}-{task_id[:8]}"
             image_tag = f"mgi/{mpi_name}:{task_id[:8]}"
@@ -770,55 +797,65 @@ def build_mgi_image(task_id: str, release_id: int):
             except Exception as e:
                 logger.error(f"Task {task_id}: Could not create build record in Core: {e}")
 
-            # Ensure builder computer in DB and generate certificates
-            try:
-                _ensure_builder_computer_in_db(project_id, flavour["id"])
-                cert_path, decrypted_key_path = _ensure_builder_certificate(project_id)
-
-                keys_dest = build_dir / "keys"
-                keys_dest.mkdir(parents=True, exist_ok=True)
-                shutil.copy(cert_path, keys_dest / "computer.crt")
-                shutil.copy(decrypted_key_path, keys_dest / "computer.key")
-                logger.info("Builder certificates injected into build context keys/")
-            except Exception as e:
-                logger.error(f"Task {task_id}: Failed to ensure or inject builder certificates: {e}")
-                raise
-
-            generate_dockerfile(project_data, config_data, flavour, release_data, build_dir)
-
-            # Copy certificate to build context
-            cert_name = f"ca-{FQDN}.crt"
-            src_cert = MGI_POOL_DIR.parent / "install" / cert_name
-            if src_cert.exists():
-                dest_dir = build_dir / "pool" / "install"
-                dest_dir.mkdir(parents=True, exist_ok=True)
-                shutil.copy(src_cert, dest_dir / cert_name)
-                logger.info(f"Copied {src_cert} to {dest_dir}")
-
-                # Also copy CA to keys/ for local validation if needed
-                shutil.copy(src_cert, build_dir / "keys" / "ca.crt")
-            else:
-                logger.warning(f"Certificate {src_cert} not found")
-
-            # Export and copy repository GPG public key to build context
+            if not _builder_lock.acquire(blocking=False):
+                _flavour_progress(5, "Waiting for another build to release the builder identity")
+                with _timed(timings, "wait"):
+                    _builder_lock.acquire()
             try:
-                keys_gnupg = PATH_DATASHARES / STACK / "keys" / ".gnupg"
-                gpg_dest_dir = build_dir / "pool" / "install"
-                gpg_dest_dir.mkdir(parents=True, exist_ok=True)
-                gpg_dest_file = gpg_dest_dir / f"{FQDN}.gpg"
-                logger.info(f"Exporting repository GPG key to {gpg_dest_file}...")
-                gpg_cmd = ["gpg", "--homedir", str(keys_gnupg), "--export", "migasfree-repository"]
-                with open(gpg_dest_file, "wb") as f:
-                    subprocess.run(gpg_cmd, stdout=f, check=True)
-            except Exception as e:
-                logger.error(f"Task {task_id}: Failed to export repository GPG key: {e}")
-                raise
-
-            _flavour_progress(15, "Building Docker image")
-            build_docker_image(build_dir, image_tag, progress_cb=_flavour_progress, task_id=task_id)
+                with _timed(timings, "prepare"):
+                    # Ensure builder computer in DB and generate certificates
+                    try:
+                        _ensure_builder_computer_in_db(project_id, flavour["id"])
+                        cert_path, decrypted_key_path = _ensure_builder_certificate(project_id)
+
+                        keys_dest = build_dir / "keys"
+                        keys_dest.mkdir(parents=True, exist_ok=True)
+                        shutil.copy(cert_path, keys_dest / "computer.crt")
+                        shutil.copy(decrypted_key_path, keys_dest / "computer.key")
+                        logger.info("Builder certificates injected into build context keys/")
+                    except Exception as e:
+                        logger.error(f"Task {task_id}: Failed to ensure or inject builder certificates: {e}")
+                        raise
+
+                    generate_dockerfile(project_data, config_data, flavour, release_data, build_dir)
+
+                    # Copy certificate to build context
+                    cert_name = f"ca-{FQDN}.crt"
+                    src_cert = MGI_POOL_DIR.parent / "install" / cert_name
+                    if src_cert.exists():
+                        dest_dir = build_dir / "pool" / "install"
+                        dest_dir.mkdir(parents=True, exist_ok=True)
+                        shutil.copy(src_cert, dest_dir / cert_name)
+                        logger.info(f"Copied {src_cert} to {dest_dir}")
+
+                        # Also copy CA to keys/ for local validation if needed
+                        shutil.copy(src_cert, build_dir / "keys" / "ca.crt")
+                    else:
+                        logger.warning(f"Certificate {src_cert} not found")
+
+                    # Export and copy repository GPG public key to build context
+                    try:
+                        keys_gnupg = PATH_DATASHARES / STACK / "keys" / ".gnupg"
+                        gpg_dest_dir = build_dir / "pool" / "install"
+                        gpg_dest_dir.mkdir(parents=True, exist_ok=True)
+                        gpg_dest_file = gpg_dest_dir / f"{FQDN}.gpg"
+                        logger.info(f"Exporting repository GPG key to {gpg_dest_file}...")
+                        gpg_cmd = ["gpg", "--homedir", str(keys_gnupg), "--export", "migasfree-repository"]
+                        with open(gpg_dest_file, "wb") as f:
+                            subprocess.run(gpg_cmd, stdout=f, check=True)
+                    except Exception as e:
+                        logger.error(f"Task {task_id}: Failed to export repository GPG key: {e}")
+                        raise
+
+                _flavour_progress(15, "Building Docker image")
+                with _timed(timings, "docker_build"):
+                    build_docker_image(build_dir, image_tag, progress_cb=_flavour_progress, task_id=task_id)
+            finally:
+                _builder_lock.release()
 
             _flavour_progress(35, "Exporting and extracting root filesystem")
-            export_and_extract(image_tag, container_name, root_dir, progress_cb=_flavour_progress)
+            with _timed(timings, "export"):
+                export_and_extract(image_tag, container_name, root_dir, progress_cb=_flavour_progress)
 
             _flavour_progress(38, "Configuring network, hosts and keyboard")
             etc_dir = root_dir / "etc"
@@ -842,17 +879,19 @@ def build_mgi_image(task_id: str, release_id: int):
             for part in raw_partitions:
                 name = part["name"]
                 raw_path = build_dir / f"{name}.raw"
-                source_dir = root_dir / part["mount"].lstrip("/")
-                if not source_dir.exists():
-                    source_dir.mkdir(parents=True, exist_ok=True)
+                headroom = 128 if name == "SYSTEM" else 8
 
-                if name == "SYSTEM":
-                    (source_dir / "boot" / "grub").mkdir(parents=True, exist_ok=True)
-                    (source_dir / "boot" / "efi").mkdir(parents=True, exist_ok=True)
+                with _timed(timings, "filesystem"):
+                    source_dir = root_dir / part["mount"].lstrip("/")
+                    if not source_dir.exists():
+                        source_dir.mkdir(parents=True, exist_ok=True)
 
-                headroom = 128 if name == "SYSTEM" else 8
-                _flavour_progress(55, f"Creating {name}.raw")
-                _create_ext4_image_from_dir(source_dir, raw_path, headroom_mb=headroom)
+                    if name == "SYSTEM":
+                        (source_dir / "boot" / "grub").mkdir(parents=True, exist_ok=True)
+                        (source_dir / "boot" / "efi").mkdir(parents=True, exist_ok=True)
+
+                    _flavour_progress(55, f"Creating {name}.raw")
+                    _create_ext4_image_from_dir(source_dir, raw_path, headroom_mb=headroom)
 
             _flavour_progress(80, "Generating metadata")
             generate_partition_yml(build_dir, config_data)
@@ -884,22 +923,24 @@ def build_mgi_image(task_id: str, release_id: int):
                 (build_dir / "provision.sh.j2").write_text(provision_script, encoding="utf-8")
                 logger.info("Generated provision.sh.j2 in build directory")
 
-            generate_checksums(build_dir, config_data)
+            with _timed(timings, "checksums"):
+                generate_checksums(build_dir, config_data)
 
             _flavour_progress(90, "Moving files to pool directory")
-            pool_dir.mkdir(parents=True, exist_ok=True)
-            for part in raw_partitions:
-                f = f"{part['name']}.raw"
-                fpath = build_dir / f
-                if fpath.exists():
-                    shutil.move(str(fpath), str(pool_dir / f))
-            for f in ["partition.yml", "checksums.sha256", "provision.sh.j2"]:
-                fpath = build_dir / f
-                if fpath.exists():
-                    shutil.move(str(fpath), str(pool_dir / f))
-
-            _flavour_progress(95, "Setting permissions")
-            subprocess.run(["chown", "-R", "890:890", str(MGI_POOL_DIR)], check=True)
+            with _timed(timings, "publish"):
+                pool_dir.mkdir(parents=True, exist_ok=True)
+                for part in raw_partitions:
+                    f = f"{part['name']}.raw"
+                    fpath = build_dir / f
+                    if fpath.exists():
+                        shutil.move(str(fpath), str(pool_dir / f))
+                for f in ["partition.yml", "checksums.sha256", "provision.sh.j2"]:
+                    fpath = build_dir / f
+                    if fpath.exists():
+                        shutil.move(str(fpath), str(pool_dir / f))
+
+                _flavour_progress(95, "Setting permissions")
+                subprocess.run(["chown", "-R", "890:890", str(MGI_POOL_DIR)], check=True)
 
             try:
                 build_id_val = build_record["id"] if build_record else None
@@ -909,6 +950,9 @@ def build_mgi_image(task_id: str, release_id: int):
 
             _cleanup_build(build_dir, image_tag)
 
+            summary = ", ".join(f"{stage} {seconds}s" for stage, seconds in timings.items())
+            append_task_log(MGI_TASK_PREFIX, task_id, f"[TIMINGS] {mpi_name}: {summary}")
+
             if build_record:
                 try:
                     uri = f"https://{FQDN}/pool/mgi/{mpi_name}/"
@@ -920,12 +964,12 @@ def build_mgi_image(task_id: str, release_id: int):
                 except Exception as e:
                     logger.error(f"Task {task_id}: Could not update build record to completed in Core: {e}")
 
-        _update_task_status(task_id, "completed", 100, "Build completed successfully")
+        _update_task_status(task_id, "completed", 100, "Build completed successfully", timings=task_timings)
         logger.info(f"Task {task_id}: Build completed for release {release_id}")
 
     except Exception as e:
         logger.error(f"Task {task_id}: Build failed: {e}")
-        _update_task_status(task_id, "error", 0, str(e))
+        _update_task_status(task_id, "error", 0, str(e), timings=task_timings)
         if "build_record" in locals() and build_record:
             try:
                 _update_build_record(build_record["id"], "failed", log=str(e))
@@ -943,9 +987,9 @@ def _cleanup_build(build_dir: Path, image_tag: str) -> None:
         shutil.rmtree(build_dir, ignore_errors=True)
 
 
-def _mgi_worker():
+def _mgi_worker(worker_id: int):
     con = get_redis_connection()
-    logger.info("MGI build worker started")
+    logger.info(f"MGI build worker {worker_id} started")
     while True:
         try:
             result = con.blpop(MGI_QUEUE_KEY, timeout=5)
@@ -955,11 +999,11 @@ def _mgi_worker():
             task = json.loads(task_data) if isinstance(task_data, str) else json.loads(task_data.decode("utf-8"))
             task_id = task.get("task_id", str(uuid.uuid4()))
             release_id = task.get("release_id")
-            logger.info(f"MGI worker processing task {task_id} for release {release_id}")
+            logger.info(f"MGI worker {worker_id} processing task {task_id} for release {release_id}")
             _update_task_status(task_id, "queued", 0, "Task accepted, starting build")
             build_mgi_image(task_id, release_id)
         except Exception as e:
-            logger.error(f"MGI worker error: {e}")
+            logger.error(f"MGI worker {worker_id} error: {e}")
             time.sleep(5)
             try:
                 con = get_redis_connection()
@@ -968,14 +1012,13 @@ def _mgi_worker():
 
 
 def start_mgi_worker():
-    import asyncio
-
-    def _run_worker():
+    def _run_worker(worker_id):
         try:
-            _mgi_worker()
+            _mgi_worker(worker_id)
         except Exception as e:
-            logger.error(f"MGI worker crashed: {e}")
+            logger.error(f"MGI worker {worker_id} crashed: {e}")
 
-    loop = asyncio.get_running_loop()
-    loop.run_in_executor(None, _run_worker)
-    logger.info("MGI build worker registered")
+    # Dedicated threads: builds last minutes and must not hold the default executor
+    for worker_id in range(MGI_BUILD_WORKERS):
+        threading.Thread(target=_run_worker, args=(worker_id,), name=f"mgi-worker-{worker_id}", daemon=True).start()
+    logger.info(f"{MGI_BUILD_WORKERS} MGI build workers registered")
@@ -65,6 +65,7 @@ class BuildTaskStatus(BaseModel):
     message: str = ""
     created_at: str | None = None
     updated_at: str | None = None
+    timings: dict[str, dict[str, float]] = {}  # MGI only: seconds per build stage, per MPI
 
 
 class BuildTaskLogsResponse(BaseModel):
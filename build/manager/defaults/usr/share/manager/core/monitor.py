@@ -2,9 +2,12 @@ import os
 import logging
 import docker
 import sys
+import time
 import asyncio
+from collections import deque
 
 
+from core.broadcast import BroadcastHub
 from core.utils import get_timestamp
 
 
@@ -29,20 +32,99 @@ node_names_cache = {}  # Cache for node names
 
 STACK = os.environ["STACK"]
 
+# Full reconcile interval (seconds): safety net for changes without events
+# (task state changes of replicas running on other nodes emit none)
+RECONCILE_INTERVAL = 10
+# Local container events that change the status of the service they belong to
+CONTAINER_ACTIONS = ("start", "die", "oom", "kill", "health_status")
+# Wait for an event burst to settle before refreshing a service
+EVENT_DEBOUNCE = 2
+
+STARTING_STATES = ["preparing", "starting", "assigned", "accepted", "ready"]
+FAILED_STATES = ["failed", "rejected", "shutdown", "orphaned"]
+
+
+def is_monitored(service_name):
+    return service_name.startswith(f"{STACK}_") or service_name.startswith("infra_")
+
+
+def compute_service_status(service_attrs, tasks, active_nodes):
+    """Builds the status of a service from its spec and its tasks"""
+    running_tasks = [t for t in tasks if t["Status"]["State"] == "running"]
+    running = len(running_tasks)
+    preparing = len([t for t in tasks if t["Status"]["State"] in STARTING_STATES])
+    failed = len([t for t in tasks if t["Status"]["State"] in FAILED_STATES])
+
+    nodes_info = []
+    containers_info = []
+    for task in running_tasks:
+        node_id = task.get("NodeID", "")
+        if node_id:
+            nodes_info.append(node_names_cache.get(node_id, node_id[:12]))
+
+        container_id = task["Status"].get("ContainerStatus", {}).get("ContainerID", "")
+        if container_id:
+            containers_info.append(container_id[:12])
+
+    mode = service_attrs["Spec"].get("Mode", {})
+    if "Replicated" in mode:
+        desired = mode["Replicated"]["Replicas"]
+        mode_type = "replicated"
+    else:
+        desired = active_nodes
+        mode_type = "global"
+
+    if running == desired and desired > 0:
+        status = "healthy"
+    elif running > 0 and running < desired:
+        status = "degraded"
+    elif running == 0 and preparing > 0:
+        status = "starting"
+    elif running == 0 and desired > 0:
+        status = "down"
+    else:
+        status = "unknown"
+
+    return {
+        "running": running,
+        "desired": desired,
+        "preparing": preparing,
+        "failed": failed,
+        "status": status,
+        "mode": mode_type,
+        "nodes": nodes_info,
+        "containers": containers_info,
+    }
+
 
 class DockerSwarmMonitor:
+    """
+    Keeps the status of the stack services.
+
+    State is built from one bulk listing of services, tasks and nodes, then
+    updated per service from the Docker event stream. A periodic full
+    reconcile catches anything the event stream does not report.
+    """
+
     def __init__(self):
         self.client = None
         self.service_states = {}
+        self.active_nodes = 0
         self.lock = asyncio.Lock()
         self.cache_lock = asyncio.Lock()  # Cache Lock
-        self.client_id_lock = asyncio.Lock()  # SSE clients Lock
         self.running = False
-        # Use asyncio.Queue for SSE clients to avoid blocking and support concurrency
-        self.sse_clients: dict[int, asyncio.Queue] = {}
+        # SSE fan-out (encode once, coalesce per service for slow clients)
+        self.hub = BroadcastHub()
         self.messages_log = []
         self.pending_updates = {}  # For event debouncing
 
+        # Engine counters
+        self.api_calls = deque()  # Timestamps of Docker API calls (last minute)
+        self.last_latency = 0.0  # Seconds from detection to broadcast
+        self.max_latency = 0.0
+        self.reconciles = 0
+        self.events_received = 0
+
         try:
             self.client = docker.from_env()
             info = self.client.info()
@@ -64,118 +146,77 @@ class DockerSwarmMonitor:
             logger.error(f"Error connecting to Docker: {e}")
             self.client = None
 
-    async def get_active_nodes_count(self):
-        if not self.client:
-            return 0
+    def _count_api_calls(self, count=1):
+        now = time.monotonic()
+        self.api_calls.extend([now] * count)
+        while self.api_calls and self.api_calls[0] < now - 60:
+            self.api_calls.popleft()
+
+    def stats(self):
+        """Engine counters: Docker API calls per minute and status latency"""
+        self._count_api_calls(0)
+        return {
+            "services": len(self.service_states),
+            "active_nodes": self.active_nodes,
+            "docker_api_calls_per_minute": len(self.api_calls),
+            "reconciles": self.reconciles,
+            "events_received": self.events_received,
+            "last_status_latency_ms": round(self.last_latency * 1000, 1),
+            "max_status_latency_ms": round(self.max_latency * 1000, 1),
+            "sse": self.hub.stats(),
+        }
 
-        try:
-            nodes = self.client.nodes.list()
-            active = len(
-                [
-                    n
-                    for n in nodes
-                    if n.attrs["Status"]["State"] == "ready"
-                    and n.attrs["Spec"]["Availability"] == "active"
-                ]
+    async def get_active_nodes_count(self):
+        return self.active_nodes
+
+    def _refresh_nodes(self, nodes):
+        for node in nodes:
+            node_names_cache[node["ID"]] = node["Description"]["Hostname"]
+        self.active_nodes = len(
+            [
+                n
+                for n in nodes
+                if n["Status"]["State"] == "ready"
+                and n["Spec"]["Availability"] == "active"
+            ]
+        )
+
+    def _fetch_snapshot(self):
+        """Bulk listing (3 API calls): returns {service_name: status}"""
+        api = self.client.api
+        services = api.services()
+        tasks = api.tasks()
+        nodes = api.nodes()
+
+        self._refresh_nodes(nodes)
+
+        tasks_by_service = {}
+        for task in tasks:
+            tasks_by_service.setdefault(task.get("ServiceID"), []).append(task)
+
+        snapshot = {}
+        for service in services:
+            name = service["Spec"]["Name"]
+            if not is_monitored(name):
+                continue
+            snapshot[name] = compute_service_status(
+                service, tasks_by_service.get(service["ID"], []), self.active_nodes
             )
-            return active
-        except Exception as e:
-            logger.warning(f"Error counting nodes: {e}")
-            return 0
-
-    async def get_service_status(self, service_name, service_obj=None):
-        if not self.client:
-            return None
+        return snapshot
 
-        logger.debug("service_name: %s", service_name)
+    def _fetch_service(self, service_name):
+        """Single service refresh (2 API calls): returns its status or None"""
+        api = self.client.api
         try:
-            if service_obj:
-                service = service_obj
-            else:
-                service = await asyncio.to_thread(self.client.services.get, service_name)
-
-            tasks = await asyncio.to_thread(service.tasks)
-
-            running_tasks = [t for t in tasks if t["Status"]["State"] == "running"]
-            running = len(running_tasks)
-            preparing = len(
-                [
-                    t
-                    for t in tasks
-                    if t["Status"]["State"]
-                    in ["preparing", "starting", "assigned", "accepted", "ready"]
-                ]
-            )
-            failed = len(
-                [
-                    t
-                    for t in tasks
-                    if t["Status"]["State"]
-                    in ["failed", "rejected", "shutdown", "orphaned"]
-                ]
-            )
-
-            nodes_info = []
-            containers_info = []
-
-            for task in running_tasks:
-                node_id = task.get("NodeID", "")
-                if node_id:
-                    if node_id in node_names_cache:
-                        nodes_info.append(node_names_cache[node_id])
-                    else:
-                        try:
-                            node = await asyncio.to_thread(self.client.nodes.get, node_id)
-                            node_name = node.attrs["Description"]["Hostname"]
-                            node_names_cache[node_id] = node_name
-                            nodes_info.append(node_name)
-                        except Exception:
-                            nodes_info.append(node_id[:12])
-
-                container_id = (
-                    task["Status"].get("ContainerStatus", {}).get("ContainerID", "")
-                )
-                if container_id:
-                    containers_info.append(container_id[:12])
-
-            mode = service.attrs["Spec"].get("Mode", {})
-            if "Replicated" in mode:
-                desired = mode["Replicated"]["Replicas"]
-                mode_type = "replicated"
-            else:
-                desired = await self.get_active_nodes_count()
-                mode_type = "global"
-
-            if running == desired and desired > 0:
-                status = "healthy"
-            elif running > 0 and running < desired:
-                status = "degraded"
-            elif running == 0 and preparing > 0:
-                status = "starting"
-            elif running == 0 and desired > 0:
-                status = "down"
-            else:
-                status = "unknown"
-
-            ret = {
-                "running": running,
-                "desired": desired,
-                "preparing": preparing,
-                "failed": failed,
-                "status": status,
-                "mode": mode_type,
-                "nodes": nodes_info,
-                "containers": containers_info,
-            }
-            # Detailed log only in debug mode
-            logger.debug(ret)
-
-            return ret
+            service = api.inspect_service(service_name)
+            tasks = api.tasks(filters={"service": service["ID"]})
         except docker.errors.NotFound:
             return None
-        except Exception as e:
-            logger.warning(f"Error getting status for {service_name}: {e}")
-            return None
+        return compute_service_status(service, tasks, self.active_nodes)
+
+    def _record_latency(self, started):
+        self.last_latency = time.monotonic() - started
+        self.max_latency = max(self.max_latency, self.last_latency)
 
     async def broadcast_to_sse_clients(self, event_data):
         """Broadcast event to all connected SSE clients"""
@@ -184,35 +225,9 @@ class DockerSwarmMonitor:
             logger.warning("Empty event_data, skipping broadcast")
             return
 
-        # Create snapshot without holding lock during broadcast
-        async with self.client_id_lock:
-            clients_snapshot = list(self.sse_clients.items())
-
-        if not clients_snapshot:
-            logger.debug("No SSE clients connected, skipping broadcast")
-            return
-
-        logger.debug(f"Broadcasting to {len(clients_snapshot)} client(s)")
-
-        to_remove = []
-        for cid, client_queue in clients_snapshot:
-            try:
-                client_queue.put_nowait(event_data)
-                logger.debug(f"✅ Broadcasted to client {cid}")
-            except asyncio.QueueFull:
-                logger.warning(f"SSE client {cid} queue full, marking for removal")
-                to_remove.append(cid)
-            except Exception as e:
-                logger.error(f"Error broadcasting to client {cid}: {e}")
-                to_remove.append(cid)
-
-        # Remove failed clients
-        if to_remove:
-            async with self.client_id_lock:
-                for cid in to_remove:
-                    removed = self.sse_clients.pop(cid, None)
-                    if removed:
-                        logger.info(f"Removed failed client {cid}")
+        # Status events are coalesced per service, log events are not
+        key = event_data["data"].get("service") if event_data["event"] == "status" else None
+        self.hub.publish(event_data["event"], event_data["data"], key=key)
 
     async def update_service_cache(self, service_name, status_info):
         async with self.cache_lock:
@@ -258,139 +273,154 @@ class DockerSwarmMonitor:
                 # Removed service
                 service_states_cache[service_name]["nodes"] = 0
 
-    async def check_all_services(self):
-        while self.running and self.client:
-            try:
-                services = await asyncio.to_thread(self.client.services.list)
-                for service in services:
-                    service_name = service.name
-                    if not service_name.startswith(
-                        f"{STACK}_"
-                    ) and not service_name.startswith("infra_"):
-                        continue
-                    current_status = await self.get_service_status(service_name, service_obj=service)
-                    logger.debug(
-                        "current_status service %s: %s", service_name, current_status
-                    )
-                    if not current_status:
-                        continue
+    async def apply_status(self, service_name, current_status, started):
+        """Stores a service status and notifies SSE clients when it changed"""
+        async with self.lock:
+            prev_status = self.service_states.get(service_name)
+            if prev_status == current_status:
+                return
 
-                    async with self.lock:
-                        prev_status = self.service_states.get(service_name)
-                        event_data = {
-                            "service": service_name,
-                            "status": current_status,
-                            "timestamp": get_timestamp(),
-                        }
-                        if prev_status is None:
-                            self.service_states[service_name] = current_status
-                            await self.update_service_cache(
-                                service_name, current_status
-                            )
-                            await self.broadcast_to_sse_clients(
-                                {"event": "status", "data": event_data}
-                            )
-                        elif (
-                            prev_status["status"] != current_status["status"]
-                            or prev_status["running"] != current_status["running"]
-                        ):
-                            logger.info(
-                                f"Service {service_name}: {prev_status['status']} ({prev_status['running']}/{prev_status['desired']}) -> {current_status['status']} ({current_status['running']}/{current_status['desired']})"
-                            )
-                            self.service_states[service_name] = current_status
-                            await self.update_service_cache(
-                                service_name, current_status
-                            )
-                            await self.broadcast_to_sse_clients(
-                                {"event": "status", "data": event_data}
-                            )
-                            msg = {
-                                "timestamp": get_timestamp(),
-                                "service": service_name,
-                                "text": f"Status: {current_status['status']} ({current_status['running']}/{current_status['desired']})",
-                                "node": ", ".join(current_status.get("nodes", []))
-                                if current_status.get("nodes")
-                                else "unknown",
-                                "container": ", ".join(
-                                    current_status.get("containers", [])
-                                )
-                                if current_status.get("containers")
-                                else "unknown",
-                            }
-                            self.messages_log.append(msg)
-                            logger.debug("service %s, message %s", service_name, msg)
-                            await self.broadcast_to_sse_clients(
-                                {"event": "log", "data": msg}
-                            )
-
-                await asyncio.sleep(10)
-            except Exception as e:
-                if self.running:
-                    logger.error(f"Error in check_all_services: {e}")
-                await asyncio.sleep(10)
+            if current_status:
+                self.service_states[service_name] = current_status
+            else:
+                self.service_states.pop(service_name, None)
 
-    async def _debounced_update(self, service_name):
-        """Wait for more events and perform a single status update"""
-        try:
-            await asyncio.sleep(2)  # Wait for event burst to settle
-            status_info = await self.get_service_status(service_name)
-            async with self.lock:
-                if status_info:
-                    self.service_states[service_name] = status_info
-                elif service_name in self.service_states:
-                    del self.service_states[service_name]
+            await self.update_service_cache(service_name, current_status)
 
             event_data = {
                 "service": service_name,
-                "status": status_info,
+                "status": current_status,
                 "timestamp": get_timestamp(),
             }
-            await self.update_service_cache(service_name, status_info)
-            await self.broadcast_to_sse_clients(
-                {"event": "status", "data": event_data}
-            )
+            await self.broadcast_to_sse_clients({"event": "status", "data": event_data})
+            self._record_latency(started)
+
+            if (
+                prev_status
+                and current_status
+                and (
+                    prev_status["status"] != current_status["status"]
+                    or prev_status["running"] != current_status["running"]
+                )
+            ):
+                logger.info(
+                    f"Service {service_name}: {prev_status['status']} ({prev_status['running']}/{prev_status['desired']}) -> {current_status['status']} ({current_status['running']}/{current_status['desired']})"
+                )
+                msg = {
+                    "timestamp": get_timestamp(),
+                    "service": service_name,
+                    "text": f"Status: {current_status['status']} ({current_status['running']}/{current_status['desired']})",
+                    "node": ", ".join(current_status.get("nodes", []))
+                    if current_status.get("nodes")
+                    else "unknown",
+                    "container": ", ".join(current_status.get("containers", []))
+                    if current_status.get("containers")
+                    else "unknown",
+                }
+                self.messages_log.append(msg)
+                logger.debug("service %s, message %s", service_name, msg)
+                await self.broadcast_to_sse_clients({"event": "log", "data": msg})
+
+    async def reconcile(self):
+        """Full resync from a bulk listing of services, tasks and nodes"""
+        started = time.monotonic()
+        snapshot = await asyncio.to_thread(self._fetch_snapshot)
+        self._count_api_calls(3)
+        self.reconciles += 1
+
+        for service_name, status in snapshot.items():
+            await self.apply_status(service_name, status, started)
+
+        # Services that no longer exist
+        for service_name in set(self.service_states) - set(snapshot):
+            await self.apply_status(service_name, None, started)
+
+    async def reconcile_loop(self):
+        while self.running and self.client:
+            await asyncio.sleep(RECONCILE_INTERVAL)
+            try:
+                await self.reconcile()
+            except Exception as e:
+                if self.running:
+                    logger.error(f"Error in reconcile: {e}")
+
+    async def _debounced_update(self, key, started):
+        """Wait for more events and perform a single status update"""
+        try:
+            await asyncio.sleep(EVENT_DEBOUNCE)  # Wait for event burst to settle
+            if key is None:
+                # Node changes may alter global services and node names
+                await self.reconcile()
+            else:
+                status_info = await asyncio.to_thread(self._fetch_service, key)
+                self._count_api_calls(2)
+                logger.debug("service %s status: %s", key, status_info)
+                await self.apply_status(key, status_info, started)
         except Exception as e:
-            logger.error(f"Error in debounced_update for {service_name}: {e}")
+            logger.error(f"Error in debounced_update for {key}: {e}")
         finally:
-            self.pending_updates.pop(service_name, None)
+            self.pending_updates.pop(key, None)
+
+    def _schedule_update(self, key):
+        # Debounce: avoid redundant updates if multiple events arrive for the same key
+        if key not in self.pending_updates:
+            self.pending_updates[key] = asyncio.create_task(
+                self._debounced_update(key, time.monotonic())
+            )
 
     async def monitor_events(self):
         if not self.client:
             return
 
-        filters = {"type": "service"}
+        filters = {"type": ["service", "node", "container"]}
+        loop = asyncio.get_event_loop()
 
-        try:
-            event_stream = await asyncio.to_thread(
-                self.client.events, decode=True, filters=filters
-            )
-            loop = asyncio.get_event_loop()
-            while self.running:
-                event = await loop.run_in_executor(
-                    None, lambda: next(event_stream, None)
+        while self.running:
+            try:
+                event_stream = await asyncio.to_thread(
+                    self.client.events, decode=True, filters=filters
                 )
-                if event is None:
-                    await asyncio.sleep(1)
-                    continue
-                action = event.get("Action", "unknown")
-                attrs = event.get("Actor", {}).get("Attributes", {})
-                service_name = attrs.get("name", "unknown")
-
-                if not service_name.startswith(
-                    f"{STACK}_"
-                ) and not service_name.startswith("infra_"):
-                    continue
-
-                logger.info(f"Service event: {action} - {service_name}")
-
-                # Debounce: avoid redundant updates if multiple events arrive for the same service
-                if service_name not in self.pending_updates:
-                    self.pending_updates[service_name] = asyncio.create_task(
-                        self._debounced_update(service_name)
+                self._count_api_calls()
+                while self.running:
+                    event = await loop.run_in_executor(
+                        None, lambda: next(event_stream, None)
                     )
-        except Exception as e:
+                    if event is None:
+                        # Stream ended: reconnect
+                        break
+
+                    self.events_received += 1
+                    action = event.get("Action", "unknown")
+
+                    if event.get("Type") == "node":
+                        logger.info(f"Node event: {action}")
+                        self._schedule_update(None)
+                        continue
+
+                    attrs = event.get("Actor", {}).get("Attributes", {})
+                    if event.get("Type") == "container":
+                        # Swarm emits no service event when a replica fails or restarts
+                        if action.split(":")[0] not in CONTAINER_ACTIONS:
+                            continue
+                        service_name = attrs.get("com.docker.swarm.service.name", "unknown")
+                    else:
+                        service_name = attrs.get("name", "unknown")
+                    if not is_monitored(service_name):
+                        continue
+
+                    if event.get("Type") == "container":
+                        logger.debug(f"Container event: {action} - {service_name}")
+                    else:
+                        logger.info(f"Service event: {action} - {service_name}")
+                    self._schedule_update(service_name)
+            except Exception as e:
+                if self.running:
+                    logger.error(f"Error in monitor_events: {e}")
+
             if self.running:
-                logger.error(f"Error in monitor_events: {e}")
+                # Events may have been missed while disconnected
+                await asyncio.sleep(5)
+                self._schedule_update(None)
 
     async def start(self):
         if not self.client:
@@ -401,22 +431,12 @@ class DockerSwarmMonitor:
 
         # Loads initial state
         try:
-            services = self.client.services.list()
-            async with self.lock:
-                for service in services:
-                    if not service.name.startswith(
-                        f"{STACK}_"
-                    ) and not service.name.startswith("infra_"):
-                        continue
-                    status = await self.get_service_status(service.name)
-                    if status:
-                        self.service_states[service.name] = status
-                        await self.update_service_cache(service.name, status)
+            await self.reconcile()
         except Exception as e:
             logger.error(f"Error loading initial state: {e}")
 
         # Run monitoring tasks asynchronously
-        asyncio.create_task(self.check_all_services())
+        asyncio.create_task(self.reconcile_loop())
         asyncio.create_task(self.monitor_events())
         logger.info("Docker Swarm monitor started")
 
@@ -0,0 +1,167 @@
+import asyncio
+import json
+import logging
+import uuid
+
+import websockets
+
+from core.config import FQDN
+
+logger = logging.getLogger(__name__)
+
+SYNC_COMMAND = "migasfree sync"
+SYNC_EXEC_TIMEOUT = 600  # seconds to wait for a sync to complete
+SYNC_CLIENT_CN = "manager"
+
+
+def get_relay_url(agent_data: dict) -> str | None:
+    """Internal relay URL for an agent (same routing as the tunnel web console)"""
+    relay = agent_data.get("relay")
+    if relay:
+        # Bypass proxy and connect directly to 'tunnel' service
+        return "ws://tunnel:8080" if FQDN in relay else relay
+    server_ip = agent_data.get("server_ip")
+    if server_ip:
+        return f"ws://{server_ip}:8080"
+    return None
+
+
+class RelayConnection:
+    """
+    Persistent client connection to a tunnel relay.
+    Exec requests are multiplexed by exec_id and their results are
+    routed back by a single reader task.
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+        self.ws = None
+        self.pending: dict[str, asyncio.Future] = {}
+        self._reader = None
+        self._lock = asyncio.Lock()
+
+    def is_open(self) -> bool:
+        return self.ws is not None and self._reader is not None and not self._reader.done()
+
+    async def connect(self):
+        async with self._lock:
+            if self.is_open():
+                return
+            ws = await websockets.connect(self.url, open_timeout=10, ping_interval=30)
+            await ws.send(json.dumps({"type": "connect_client"}))
+            await ws.recv()
+            self.ws = ws
+            self._reader = asyncio.create_task(self._read())
+            logger.info(f"Sync dispatcher connected to relay {self.url}")
+
+    async def _read(self):
+        try:
+            async for message in self.ws:
+                if isinstance(message, bytes):
+                    continue
+                msg = json.loads(message)
+                future = self.pending.get(msg.get("exec_id"))
+                if future is None or future.done():
+                    continue
+
+                msg_type = msg.get("type")
+                if msg_type == "exec_complete":
+                    exit_code = msg.get("exit_code", 0)
+                    if exit_code == 0:
+                        future.set_result(True)
+                    else:
+                        future.set_exception(
+                            Exception(f"Command exited with status {exit_code}")
+                        )
+                elif msg_type == "exec_error":
+                    future.set_exception(
+                        Exception(f"Command Error: {msg.get('error', 'Unknown error')}")
+                    )
+        except Exception as e:
+            logger.warning(f"Relay connection {self.url} lost: {e}")
+        finally:
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("Relay connection closed"))
+            self.pending.clear()
+
+    async def execute(self, cid: int, command: str, timeout: float):
+        await self.connect()
+
+        exec_id = f"sync-{uuid.uuid4()}"
+        future = asyncio.get_running_loop().create_future()
+        self.pending[exec_id] = future
+        try:
+            await self.ws.send(
+                json.dumps(
+                    {
+                        "type": "execute_command",
+                        "id": cid,
+                        "exec_id": exec_id,
+                        "command": command,
+                        "client_cn": SYNC_CLIENT_CN,
+                    }
+                )
+            )
+            return await asyncio.wait_for(future, timeout=timeout)
+        finally:
+            self.pending.pop(exec_id, None)
+
+    async def close(self):
+        if self._reader:
+            self._reader.cancel()
+        if self.ws:
+            await self.ws.close()
+
+
+class SyncDispatcher:
+    """
+    Long-lived dispatcher of sync requests, sent straight to the tunnel
+    relays over reused connections with a concurrency limit.
+    """
+
+    def __init__(self, max_concurrency: int):
+        self.max_concurrency = max_concurrency
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.relays: dict[str, RelayConnection] = {}
+        self.in_flight = 0
+        self._tasks = set()
+
+    def available(self) -> int:
+        """Free dispatch slots"""
+        return max(0, self.max_concurrency - self.in_flight)
+
+    def dispatch(self, cid: int, agent_data: dict) -> bool:
+        url = get_relay_url(agent_data)
+        if not url:
+            logger.warning(f"CID {cid} has no relay or ip registered")
+            return False
+
+        self.in_flight += 1
+        task = asyncio.create_task(self._run(cid, url))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return True
+
+    async def _run(self, cid: int, url: str):
+        try:
+            async with self.semaphore:
+                relay = self.relays.get(url)
+                if relay is None:
+                    relay = self.relays[url] = RelayConnection(url)
+                await relay.execute(cid, SYNC_COMMAND, SYNC_EXEC_TIMEOUT)
+            logger.info(f"Sync triggered for CID {cid} via relay")
+        except Exception as e:
+            logger.error(f"Error triggering sync for CID {cid}: {e}")
+        finally:
+            self.in_flight -= 1
+
+    async def close(self):
+        for task in list(self._tasks):
+            task.cancel()
+        for relay in self.relays.values():
+            try:
+                await relay.close()
+            except Exception:
+                pass
+        self.relays = {}
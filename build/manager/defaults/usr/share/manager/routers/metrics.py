@@ -1,5 +1,5 @@
 import logging
-from fastapi import APIRouter, Request
+from fastapi import APIRouter, Query, Request
 from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
 
@@ -12,6 +12,7 @@ from core.config import (
     SYNC_MAX_DB_LATENCY,
     SYNC_MAX_CORE_LOAD,
     METRICS_RECORDING_INTERVAL,
+    METRICS_RETENTION_LIMIT,
 )
 
 logger = logging.getLogger(__name__)
@@ -23,12 +24,21 @@ templates = Jinja2Templates(directory="/usr/share/manager/templates")
 
 
 @router_private.get("/metrics/json")
-async def metrics_json():
+async def metrics_json(
+    start: float | None = Query(None, alias="from"),
+    end: float | None = Query(None, alias="to"),
+    step: int | None = Query(None, ge=1),
+    since: float | None = None,
+    limit: int = Query(1000, ge=1, le=10000),
+):
     """
     Return metrics in JSON format for the dashboard.
+    Use 'since' to poll only new samples, or 'from'/'to'/'step' for ranges.
     """
     current = get_saturation_metrics()
-    history = get_metrics_from_history()
+    tier, history = get_metrics_from_history(
+        limit=limit, start=start, end=end, step=step, since=since
+    )
 
     # Normalize current to match history structure if needed, or just send as is
     # Add attempts to 'current' snapshot
@@ -37,10 +47,12 @@ async def metrics_json():
     data = {
         "current": current,
         "history": history,
+        "tier": tier,
         "limits": {
             "db_latency": SYNC_MAX_DB_LATENCY,
             "core_cpu": SYNC_MAX_CORE_LOAD,
             "recording_interval": METRICS_RECORDING_INTERVAL,
+            "retention": METRICS_RETENTION_LIMIT,
         },
     }
     return data
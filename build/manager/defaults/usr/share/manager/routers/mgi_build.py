@@ -75,6 +75,7 @@ async def get_build_status(task_id: str):
         message=data.get("message", ""),
         created_at=data.get("created_at"),
         updated_at=data.get("updated_at"),
+        timings=json.loads(data.get("timings") or "{}"),
     )
 
 
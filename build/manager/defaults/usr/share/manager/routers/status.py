@@ -1,8 +1,6 @@
 import os
 import sys
 import logging
-import asyncio
-import json
 
 from fastapi import APIRouter, Request, FastAPI
 from fastapi.responses import JSONResponse, HTMLResponse, RedirectResponse
@@ -15,6 +13,7 @@ from core.config import API_VERSION
 from core.status import Message
 from core.utils import get_timestamp, get_organization
 from core.monitor import DockerSwarmMonitor
+from core.broadcast import render_event
 from core.availability import (
     start_recording,
     stop_recording,
@@ -28,7 +27,6 @@ FQDN = os.environ["FQDN"]
 STACK = os.environ["STACK"]
 TAG = os.environ["TAG"]
 
-client_id_counter = 0
 docker_monitor = None
 
 # Logging configuration
@@ -125,61 +123,21 @@ async def status_page(request: Request):
 # SSE endpoint: manager stream
 @router_private.get("/stream")
 async def service_stream(request: Request):
-    global client_id_counter
-    queue = asyncio.Queue(maxsize=100)
-
-    async with docker_monitor.client_id_lock:
-        client_id = client_id_counter
-        client_id_counter += 1
-        docker_monitor.sse_clients[client_id] = queue
+    hub = docker_monitor.hub
+    subscriber, initial = hub.subscribe()
+    client_id = subscriber.id
 
     logger.info(
-        f"Service SSE client {client_id} connected. Total clients: {len(docker_monitor.sse_clients)}"
+        f"Service SSE client {client_id} connected. Total clients: {len(hub.subscribers)}"
     )
 
     async def event_generator():
         try:
-            # Send initial state from cache
-            cache_result = await docker_monitor.cache()
-            logger.info(
-                f"Client {client_id}: Sending initial cache with {len(cache_result)} services"
-            )
-
-            for service_name, service_data in cache_result.items():
-                # Build status object from cache - no filtering by 'nodes'
-                status_obj = {
-                    "status": service_data.get("status", "unknown"),
-                    "running": service_data.get("nodes", 0),  # This is the count
-                    "desired": 1,  # We don't store this in cache
-                    "preparing": 0,
-                    "failed": 0,
-                    "mode": "replicated",
-                    "nodes": service_data.get("node", "").split(", ")
-                    if service_data.get("node")
-                    else [],
-                    "containers": service_data.get("container", "").split(", ")
-                    if service_data.get("container")
-                    else [],
-                }
-
-                initial_data = {
-                    "service": service_name,
-                    "status": status_obj,
-                    "timestamp": get_timestamp(),
-                }
-
-                logger.debug(
-                    f"Client {client_id}: Sending {service_name} = {status_obj['status']} ({status_obj['running']})"
-                )
-                yield {"event": "status", "data": json.dumps(initial_data)}
-
-
-
-            # Send init event to signal initial load is complete
-            yield {"event": "status", "data": json.dumps({"init": True})}
+            # Send pre-rendered initial state (ends with the init event)
+            yield initial
 
             logger.info(
-                f"Client {client_id}: Initial state sent, starting event stream"
+                f"Client {client_id}: Initial state sent (version {hub.version}), starting event stream"
             )
 
             # Stream updates
@@ -188,30 +146,19 @@ async def service_stream(request: Request):
                     logger.info(f"Client {client_id}: Disconnected by request")
                     break
 
-                try:
-                    event_data = await asyncio.wait_for(queue.get(), timeout=30)
-                    logger.debug(
-                        f"Client {client_id}: Broadcasting {event_data['event']} event"
-                    )
-                    yield {
-                        "event": event_data["event"],
-                        "data": json.dumps(event_data["data"]),
-                    }
-                except asyncio.TimeoutError:
+                if await subscriber.wait(timeout=30):
+                    yield subscriber.drain()
+                else:
                     # Send keepalive ping
-                    yield {
-                        "event": "ping",
-                        "data": json.dumps({"timestamp": get_timestamp()}),
-                    }
+                    yield render_event("ping", {"timestamp": get_timestamp()})
         except Exception as e:
             logger.error(
                 f"Client {client_id}: Error in event_generator: {e}", exc_info=True
             )
         finally:
-            async with docker_monitor.client_id_lock:
-                docker_monitor.sse_clients.pop(client_id, None)
+            hub.unsubscribe(subscriber)
             logger.info(
-                f"Client {client_id}: Disconnected. Remaining: {len(docker_monitor.sse_clients)}"
+                f"Client {client_id}: Disconnected. Remaining: {len(hub.subscribers)}"
             )
 
     return EventSourceResponse(event_generator())
@@ -228,6 +175,12 @@ async def status_json():
         return JSONResponse(content={}, status_code=500)
 
 
+@router_private.get("/status/engine")
+async def status_engine():
+    """Returns status engine counters (Docker API calls, status latency)"""
+    return JSONResponse(content=docker_monitor.stats())
+
+
 @router_private.get("/info")
 async def get_info():
     """Get static application info (organization, stack, tag, disabled)"""
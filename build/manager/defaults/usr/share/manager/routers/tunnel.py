@@ -16,6 +16,7 @@ import uuid
 import os
 import logging
 
+from core import agents
 from core.config import API_VERSION, FQDN
 
 logger = logging.getLogger(__name__)
@@ -28,6 +29,25 @@ REDIS_URL = os.getenv("REDIS_URL")
 # Templates configuration
 templates = Jinja2Templates(directory="/usr/share/manager/templates")
 
+# Binary tunnel framing (must match the tunnel relay):
+# | magic (1) | origin (1) | tunnel_id length (1) | tunnel_id (utf-8) | payload |
+FRAMING_BINARY = "binary"
+FRAME_MAGIC = 0xB7
+FRAME_ORIGIN_CLIENT = 0
+
+
+def _tunnel_frame_header(tunnel_id: str) -> bytes:
+    """Pre-computes the header of client->agent frames for a tunnel"""
+    tid = tunnel_id.encode()
+    return bytes((FRAME_MAGIC, FRAME_ORIGIN_CLIENT, len(tid))) + tid
+
+
+def _tunnel_frame_payload(frame: bytes) -> memoryview | None:
+    """Returns the payload of a binary tunnel frame without copying it"""
+    if len(frame) < 3 or frame[0] != FRAME_MAGIC:
+        return None
+    return memoryview(frame)[3 + frame[2] :]
+
 
 async def get_redis():
     if not REDIS_URL:
@@ -68,43 +88,18 @@ async def register_agent(
             f"Agent {agent.id} registered without mTLS certificate (non-mTLS mode)"
         )
 
-    # Determine Relay URL
+    # Determine Relay URL (least loaded live relay)
     relay_public = None
     try:
-        # Optimization: Use a SET for tunnels instead of SCAN
-        # For now, if we can't change the whole architecture, let's at least
-        # use a more efficient way or cache the relays.
-        # Given we have 1M keys, SCAN tunnel:* is still better than SCAN agent:*
-        # but a SET is the right way.
-        keys = []
-        async for key in r.scan_iter("tunnel:*", count=100):
-            keys.append(key)
-
-        if keys:
-            tunnels_data = await r.mget(keys)
-            candidates = []
-            for t_json in tunnels_data:
-                if t_json:
-                    try:
-                        data = json.loads(t_json)
-                        if "url" in data:
-                            candidates.append(data)
-                    except json.JSONDecodeError:
-                        pass
-
-            if candidates:
-                # Select relay with minimum load
-                # We interpret 'load' as active connections
-                candidates.sort(key=lambda x: x.get("load", 0))
-                best_relay = candidates[0]
-                # Use public URL - HAProxy will handle load balancing with leastconn
-                relay_public = best_relay.get("url")
-                logger.info(
-                    f"Selected best relay: {best_relay.get('hostname')} "
-                    f"(load: {best_relay.get('load', 0)}/{best_relay.get('max_connections', 0)}) "
-                    f"URL: {relay_public}"
-                )
-
+        best_relay = await agents.select_relay(r)
+        if best_relay:
+            # Use public URL - HAProxy will handle load balancing with leastconn
+            relay_public = best_relay.get("url")
+            logger.info(
+                f"Selected best relay: {best_relay.get('hostname')} "
+                f"(load: {best_relay.get('load', 0)}/{best_relay.get('max_connections', 0)}) "
+                f"URL: {relay_public}"
+            )
     except Exception as e:
         logger.error(f"Error selecting best relay: {e}")
 
@@ -120,9 +115,8 @@ async def register_agent(
     if request.client:
         agent_data["server_ip"] = request.client.host
 
-    # Expiration? Maybe agents should send heartbeats.
-    # For now, we just set it.
-    await r.set(f"agent:{agent.id}", json.dumps(agent_data), ex=120)
+    # The relay refreshes the entry while the agent stays connected
+    await agents.register_agent(r, agent_data)
 
     logger.info(f"Agent registered: {agent.id} -> {relay_public}")
 
@@ -132,59 +126,17 @@ async def register_agent(
 async def _list_agents(
     r: redis.Redis, page: int = 1, limit: int = 2, search: str = None
 ) -> dict:
-    """Lists connected agents from Redis with pagination"""
+    """Lists connected agents from the Redis registry with pagination"""
     try:
-        # CRITICAL: With 1M keys, we CANNOT scan all of them just to count.
-        # We will limit the scan or use a cached total if available.
-        all_keys = []
-        # We only scan up to a reasonable limit for the "list" view
-        # or use a pre-calculated total.
-        count = 0
-        async for key in r.scan_iter("agent:*", count=1000):
-            all_keys.append(key)
-            count += 1
-            if count > 5000: # Safety cap for listing
-                break
-
-        total_count = count # This is now an estimate or capped count
-
-        # Calculate slices
-        start = (page - 1) * limit
-        end = start + limit
-
-        # If we have a simple slice without search
-        paged_keys = all_keys[start:end]
-
-        agents = []
-        if paged_keys:
-            # MGET only the slice (efficient)
-            values = await r.mget(paged_keys)
-            for val in values:
-                if val:
-                    try:
-                        agent_data = json.loads(val)
-                        # Basic textual search on Client Side (or filtered here if we fetched all)
-                        # For true scalability with Search, we need a Redis Index.
-                        # Here we just return the paginated chunk.
-                        # If 'search' is provided, this pagination strategy breaks because we don't know
-                        # which keys contain the search term.
-                        # REVISITED STRATEGY for this task:
-                        # 1. Ignore text search on backend for now to keep it efficient O(1) page access
-                        # 2. Or iterate all keys (slow).
-                        # Let's stick to simple pagination for performance.
-
-                        if search:
-                            if search.lower() in agent_data.get("name", "").lower():
-                                agents.append(agent_data)
-                            # Note: Search + Pagination without Index is hard.
-                            # We will fallback to returning the page, and frontend search won't span all pages.
-                        else:
-                            agents.append(agent_data)
-
-                    except json.JSONDecodeError as e:
-                        logger.warning(f"Failed to decode agent data: {e}")
-
-        return {"agents": agents, "total": total_count, "page": page, "limit": limit}
+        page_agents, total_count = await agents.list_agents(
+            r, page=page, limit=limit, search=search
+        )
+        return {
+            "agents": page_agents,
+            "total": total_count,
+            "page": page,
+            "limit": limit,
+        }
     except Exception as e:
         logger.error(f"Error listing agents: {e}")
         return {"error": str(e), "agents": [], "total": 0}
@@ -325,10 +277,16 @@ async def service_websocket(
         async with websockets.connect(**connect_args) as ws_server:
             logger.info(f"Successfully connected to relay: {target_url}")
 
-            # Identify as client
-            await ws_server.send(json.dumps({"type": "connect_client"}))
+            # Identify as client (offering binary framing for tunnel data)
+            await ws_server.send(
+                json.dumps({"type": "connect_client", "framing": FRAMING_BINARY})
+            )
             resp_ident = await ws_server.recv()
             logger.debug(f"Relay identification response: {resp_ident}")
+            try:
+                binary = json.loads(resp_ident).get("framing") == FRAMING_BINARY
+            except (json.JSONDecodeError, AttributeError):
+                binary = False
 
             # Start TCP tunnel
             tunnel_id = f"web-{uuid.uuid4()}"
@@ -351,6 +309,22 @@ async def service_websocket(
                 )
                 return
 
+            frame_header = _tunnel_frame_header(tunnel_id)
+
+            async def send_to_tunnel(data: bytes):
+                if binary:
+                    await ws_server.send(frame_header + data)
+                else:
+                    await ws_server.send(
+                        json.dumps(
+                            {
+                                "type": "tunnel_data",
+                                "tunnel_id": tunnel_id,
+                                "data": data.hex(),
+                            }
+                        )
+                    )
+
             if service == "ssh":
                 # --- SSH SPECIFIC LOGIC (PTY + Local Proxy) ---
 
@@ -430,18 +404,10 @@ async def service_websocket(
                     async def local_to_tunnel():
                         try:
                             while True:
-                                data = await loop.sock_recv(client_sock, 4096)
+                                data = await loop.sock_recv(client_sock, 65536)
                                 if not data:
                                     break
-                                await ws_server.send(
-                                    json.dumps(
-                                        {
-                                            "type": "tunnel_data",
-                                            "tunnel_id": tunnel_id,
-                                            "data": data.hex(),
-                                        }
-                                    )
-                                )
+                                await send_to_tunnel(data)
                         except Exception:
                             pass
                         finally:
@@ -453,6 +419,11 @@ async def service_websocket(
                     async def tunnel_to_local():
                         try:
                             async for msg in ws_server:
+                                if isinstance(msg, bytes):
+                                    payload = _tunnel_frame_payload(msg)
+                                    if payload:
+                                        await loop.sock_sendall(client_sock, payload)
+                                    continue
                                 msg_json = json.loads(msg)
                                 if msg_json.get("type") == "tunnel_data":
                                     data = bytes.fromhex(msg_json.get("data", ""))
@@ -634,7 +605,7 @@ async def service_websocket(
 
             else:
                 # --- GENERIC TCP PROXY (VNC/RDP) ---
-                # Direct bridge: Browser (Binary/JSON) <-> Relay (JSON with hex)
+                # Direct bridge: Browser (Binary/JSON) <-> Relay (binary frames or JSON with hex)
 
                 # Notify client connected
                 await websocket.send_json(
@@ -651,31 +622,20 @@ async def service_websocket(
 
                             data_to_send = None
 
-                            if "bytes" in message:
-                                data = message["bytes"]
-                                if data:
-                                    data_to_send = data.hex()
+                            if message.get("bytes"):
+                                data_to_send = message["bytes"]
 
-                            elif "text" in message:
+                            elif message.get("text"):
                                 # Sometimes clients might send JSON control messages
                                 try:
-                                    text_data = message["text"]
-                                    json_data = json.loads(text_data)
+                                    json_data = json.loads(message["text"])
                                     if "data" in json_data:
-                                        data_to_send = json_data["data"]  # Already hex?
+                                        data_to_send = bytes.fromhex(json_data["data"])
                                 except Exception:
                                     pass
 
                             if data_to_send:
-                                await ws_server.send(
-                                    json.dumps(
-                                        {
-                                            "type": "tunnel_data",
-                                            "tunnel_id": tunnel_id,
-                                            "data": data_to_send,
-                                        }
-                                    )
-                                )
+                                await send_to_tunnel(data_to_send)
 
                     except Exception as e:
                         logger.debug(f"Browser to tunnel error: {e}")
@@ -685,6 +645,11 @@ async def service_websocket(
                     try:
                         async for msg in ws_server:
                             try:
+                                if isinstance(msg, bytes):
+                                    payload = _tunnel_frame_payload(msg)
+                                    if payload:
+                                        await websocket.send_bytes(bytes(payload))
+                                    continue
                                 msg_json = json.loads(msg)
                                 if msg_json.get("type") == "tunnel_data":
                                     hex_data = msg_json.get("data", "")
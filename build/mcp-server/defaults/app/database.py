@@ -1,10 +1,14 @@
 import os
 import re
+import time
+import uuid
+import hashlib
 import logging
+import threading
 import psycopg2
 import psycopg2.pool
+from collections import OrderedDict
 from pathlib import Path
-from psycopg2.extras import DictCursor
 from resources import read_file
 
 logger = logging.getLogger("migasfree-mcp")
@@ -128,22 +132,156 @@ def _validate_sql(query: str) -> None:
         raise ValueError(f"Forbidden keyword: {match.group(0)}")
 
 
-def run_sql_select_query(query: str) -> list:
-    """Execute a validated SELECT query and return results as a list of dicts."""
-    _validate_sql(query)
+# Query results
+QUERY_MAX_ROWS = 500  # Rows per page (hard cap for the limit argument)
+QUERY_FETCH_SIZE = 100  # Rows transferred per round trip from the server-side cursor
+QUERY_CACHE_TTL = 60  # seconds
+QUERY_CACHE_SIZE = 128  # pages
+
+_query_cache = OrderedDict()  # (normalized query, offset, limit) -> (expires, result)
+_query_cache_lock = threading.Lock()
+
+# Literals, quoted identifiers and dollar-quoted strings (kept as is),
+# or comments and whitespace outside of them
+_SQL_TOKEN_RE = re.compile(
+    r"""('(?:[^']|'')*'|"(?:[^"]|"")*"|\$(\w*)\$.*?\$\2\$)|(?:--[^\n]*|/\*.*?\*/|\s+)+""",
+    re.DOTALL,
+)
+
+
+def _normalize_sql(query: str) -> str:
+    """
+    Query text without comments, redundant whitespace or trailing semicolon.
+    Only used as cache key and cursor hash: the original query is executed.
+    """
+    clean_query = _SQL_TOKEN_RE.sub(lambda m: m.group(1) or " ", query)
+    return clean_query.strip().rstrip(";").strip()
+
+
+def _query_hash(normalized: str) -> str:
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:16]
 
+
+def _encode_cursor(normalized: str, offset: int) -> str:
+    return f"{offset}:{_query_hash(normalized)}"
+
+
+def _decode_cursor(normalized: str, cursor: str) -> int:
+    """Returns the row offset of a pagination cursor issued for this query."""
+    try:
+        offset, query_hash = cursor.split(":", 1)
+        offset = int(offset)
+    except ValueError:
+        raise ValueError("Invalid cursor")
+    if offset < 0 or query_hash != _query_hash(normalized):
+        raise ValueError("Cursor does not belong to this query")
+    return offset
+
+
+def _cache_get(key):
+    with _query_cache_lock:
+        entry = _query_cache.get(key)
+        if entry is None:
+            return None
+        expires, result = entry
+        if expires < time.monotonic():
+            del _query_cache[key]
+            return None
+        _query_cache.move_to_end(key)
+        return result
+
+
+def _cache_put(key, result):
+    with _query_cache_lock:
+        _query_cache[key] = (time.monotonic() + QUERY_CACHE_TTL, result)
+        _query_cache.move_to_end(key)
+        while len(_query_cache) > QUERY_CACHE_SIZE:
+            _query_cache.popitem(last=False)
+
+
+def clear_query_cache():
+    """Clear the cached query results."""
+    with _query_cache_lock:
+        _query_cache.clear()
+
+
+def _fetch_page(query: str, offset: int, limit: int, explain: bool = False):
+    """Returns (column names, rows, more rows available) for a page of a query."""
     conn = get_connection()
     try:
-        with conn.cursor(cursor_factory=DictCursor) as cur:
-            cur.execute(query)
-            rows = cur.fetchall()
-            return [dict(r) for r in rows]
-    except Exception as e:
-        return {"ERROR": str(e)}
+        if explain:
+            # EXPLAIN cannot be declared as a cursor (and its output is small)
+            with conn.cursor() as cur:
+                cur.execute(query)
+                rows = cur.fetchall()[offset : offset + limit + 1]
+                columns = [d[0] for d in cur.description]
+        else:
+            # Server-side cursor: only the requested page is transferred to this process
+            conn.autocommit = False
+            with conn.cursor(name=f"mcp_{uuid.uuid4().hex}") as cur:
+                cur.itersize = QUERY_FETCH_SIZE
+                cur.execute(query)
+                if offset:
+                    cur.scroll(offset)
+                rows = cur.fetchmany(limit + 1)
+                columns = [d[0] for d in cur.description]
+        return columns, rows[:limit], len(rows) > limit
     finally:
+        try:
+            conn.rollback()
+            conn.autocommit = True
+        except Exception:
+            pass
         release_connection(conn)
 
 
+def run_sql_select_query(
+    query: str, limit: int = QUERY_MAX_ROWS, cursor: str | None = None
+) -> dict:
+    """
+    Execute a validated SELECT query and return one page of results in a
+    compact columnar format:
+
+        {"columns": [...], "values": [[column values], ...], "row_count": n,
+         "next_cursor": "..." | None}
+
+    Pass next_cursor back (with the same query) to get the following page.
+    Pages are cached for QUERY_CACHE_TTL seconds.
+    """
+    _validate_sql(query)
+
+    normalized = _normalize_sql(query)
+    limit = max(1, min(int(limit or QUERY_MAX_ROWS), QUERY_MAX_ROWS))
+    try:
+        offset = _decode_cursor(normalized, cursor) if cursor else 0
+    except ValueError as e:
+        return {"ERROR": str(e)}
+
+    key = (normalized, offset, limit)
+    result = _cache_get(key)
+    if result is not None:
+        return result
+
+    try:
+        columns, rows, has_more = _fetch_page(
+            query.strip().rstrip(";"),
+            offset,
+            limit,
+            explain=normalized.split(None, 1)[0].upper() == "EXPLAIN",
+        )
+    except Exception as e:
+        return {"ERROR": str(e)}
+
+    result = {
+        "columns": columns,
+        "values": [list(values) for values in zip(*rows)] if rows else [[] for _ in columns],
+        "row_count": len(rows),
+        "next_cursor": _encode_cursor(normalized, offset + len(rows)) if has_more else None,
+    }
+    _cache_put(key, result)
+    return result
+
+
 # Schema cache: loaded once, reused forever (schema only changes on redeploy)
 _schema_cache = None
 
@@ -169,46 +307,43 @@ def clear_schema_cache():
 
 
 def _fetch_db_schema():
-    """Fetches the database schema from PostgreSQL."""
-    query_tables = """
-        SELECT t.table_name, obj_description(c.oid) as description
+    """Fetches the database schema from PostgreSQL (tables and columns in a single query)."""
+    query = """
+        SELECT
+            cols.table_name,
+            obj_description(c.oid, 'pg_class') AS table_description,
+            cols.column_name,
+            cols.data_type,
+            cols.is_nullable,
+            cols.column_default,
+            pg_catalog.col_description(c.oid, cols.ordinal_position::int) AS description
         FROM information_schema.tables t
-        LEFT JOIN pg_class c ON c.relname = t.table_name
+        JOIN information_schema.columns cols
+          ON cols.table_schema = t.table_schema AND cols.table_name = t.table_name
+        JOIN pg_catalog.pg_namespace n ON n.nspname = t.table_schema
+        JOIN pg_catalog.pg_class c ON c.relnamespace = n.oid AND c.relname = t.table_name
         WHERE t.table_schema = 'public'
           AND t.table_type = 'BASE TABLE'
           AND t.table_name NOT LIKE 'django_%'
           AND t.table_name NOT LIKE 'auth_%'
-        ORDER BY t.table_name;
+        ORDER BY cols.table_name, cols.ordinal_position;
     """
 
-    tables = run_sql_select_query(query_tables)
-    if isinstance(tables, dict) and "ERROR" in tables:
-        return tables
-
     schema = {}
     conn = get_connection()
     try:
-        with conn.cursor(cursor_factory=DictCursor) as cur:
-            for table in tables:
-                tname = table["table_name"]
-                cur.execute(
-                    """
-                    SELECT 
-                        cols.column_name, 
-                        cols.data_type, 
-                        cols.is_nullable, 
-                        cols.column_default,
-                        pg_catalog.col_description(c.oid, cols.ordinal_position::int) AS description
-                    FROM information_schema.columns cols
-                    JOIN pg_catalog.pg_class c ON c.relname = cols.table_name
-                    JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace AND n.nspname = cols.table_schema
-                    WHERE cols.table_name = %s AND cols.table_schema = 'public'
-                    ORDER BY cols.ordinal_position;
-                    """,
-                    (tname,),
+        with conn.cursor() as cur:
+            cur.execute(query)
+            for tname, tdescription, *column in cur.fetchall():
+                table = schema.setdefault(tname, {"description": tdescription, "columns": []})
+                table["columns"].append(
+                    dict(
+                        zip(
+                            ("column_name", "data_type", "is_nullable", "column_default", "description"),
+                            column,
+                        )
+                    )
                 )
-                cols = [dict(r) for r in cur.fetchall()]
-                schema[tname] = {"description": table["description"], "columns": cols}
     except Exception as e:
         return {"ERROR": str(e)}
     finally:
@@ -22,7 +22,7 @@ from fastapi import FastAPI
 from starlette.requests import Request
 from starlette.responses import Response
 
-from database import run_sql_select_query, sync_db_to_file
+from database import run_sql_select_query, sync_db_to_file, QUERY_MAX_ROWS
 from api import sync_api_to_files
 from resources import read_file
 from docs import convert_all_pdfs_to_markdown
@@ -48,14 +48,27 @@ async def list_tools() -> list[Tool]:
     return [
         Tool(
             name="db_query",
-            description=f"Execute a SELECT SQL query on the PostgreSQL database. IMPORTANT: Before querying for table structure, metadata, or column names, YOU MUST READ the resource '{MCP_NAME}://docs/db_schema.md' which contains the full documented schema.",
+            description=(
+                f"Execute a SELECT SQL query on the PostgreSQL database. IMPORTANT: Before querying for table structure, metadata, or column names, YOU MUST READ the resource '{MCP_NAME}://docs/db_schema.md' which contains the full documented schema. "
+                "Results are columnar: 'columns' holds the column names and 'values' one list of values per column. "
+                f"At most {QUERY_MAX_ROWS} rows are returned per call; when 'next_cursor' is not null, "
+                "call again with the same sql and that cursor to get the next rows."
+            ),
             inputSchema={
                 "type": "object",
                 "properties": {
                     "sql": {
                         "type": "string",
                         "description": "The exact SQL SELECT query to execute.",
-                    }
+                    },
+                    "limit": {
+                        "type": "integer",
+                        "description": f"Maximum number of rows to return (1-{QUERY_MAX_ROWS}).",
+                    },
+                    "cursor": {
+                        "type": "string",
+                        "description": "The 'next_cursor' of a previous call with the same sql.",
+                    },
                 },
                 "required": ["sql"],
             },
@@ -103,10 +116,14 @@ async def call_tool(name: str, arguments: dict[str, Any]) -> list[TextContent]:
     try:
         if name == "db_query":
             sql = arguments.get("sql", "")
-            result = run_sql_select_query(sql)
-            return [
-                TextContent(type="text", text=json.dumps(result, indent=2, default=str))
-            ]
+            # Run in a worker thread so concurrent queries don't block the event loop
+            result = await anyio.to_thread.run_sync(
+                run_sql_select_query,
+                sql,
+                arguments.get("limit") or QUERY_MAX_ROWS,
+                arguments.get("cursor"),
+            )
+            return [TextContent(type="text", text=json.dumps(result, default=str))]
 
         if name == "read_doc":
             return _handle_read_doc(arguments.get("name", ""))
@@ -224,6 +224,10 @@ class ContextLoader:
         self.default("METRICS_RECORDING_INTERVAL", "15")
         self.default("METRICS_RETENTION_LIMIT", "14400")
 
+        # MGI BUILDER
+        # ===========
+        self.default("MGI_BUILD_WORKERS", "2")
+
         self.save_stack()
 
     def comment(self, key):
@@ -501,6 +505,12 @@ class ContextLoader:
 #    Duration (seconds) to keep metrics history.
 #    Default: 14400 (4 hours)
 # {line}
+""",
+            "MGI_BUILD_WORKERS": f"""# {line}
+# MGI_BUILD_WORKERS
+#    Number of MGI build tasks processed in parallel.
+#    Default: 2
+# {line}
 """,
 
             "HTTP_PROXY": f"""# {line}
@@ -8,6 +8,7 @@ import logging
 import os
 import resource
 import socket
+import time
 import uuid
 from urllib.parse import urlparse
 
@@ -50,6 +51,32 @@ REDIS_URL = os.environ["REDIS_URL"]
 FQDN = os.environ["FQDN"]
 TUNNEL_CONNECTIONS = int(os.environ["TUNNEL_CONNECTIONS"])
 
+# Binary tunnel frames carry the raw TCP payload behind a small routing header:
+# | magic (1) | origin (1) | tunnel_id length (1) | tunnel_id (utf-8) | payload |
+# Peers opt in with {"framing": "binary"} in register_agent / connect_client.
+FRAMING_BINARY = "binary"
+FRAME_MAGIC = 0xB7
+FRAME_ORIGIN_CLIENT = 0
+FRAME_ORIGIN_AGENT = 1
+FRAME_ORIGINS = {FRAME_ORIGIN_CLIENT: "client", FRAME_ORIGIN_AGENT: "agent"}
+
+# Agent registry keys (shared with the manager, see core/agents.py)
+AGENT_TTL = 300
+AGENTS_SEEN_KEY = "agents:seen"  # ZSET agent id -> last-seen timestamp
+AGENTS_NAMES_KEY = "agents:names"  # ZSET "name\0id" for prefix search
+AGENTS_LEX_KEY = "agents:lex"  # HASH agent id -> member in agents:names
+RELAYS_KEY = "tunnel:relays"  # ZSET relay id -> load
+
+
+def parse_tunnel_frame(frame):
+    """Returns (origin, tunnel_id, payload_offset) without touching the payload"""
+    if len(frame) < 3 or frame[0] != FRAME_MAGIC:
+        return None
+    offset = 3 + frame[2]
+    if len(frame) < offset:
+        return None
+    return frame[1], frame[3:offset].decode(), offset
+
 
 class MultiProtocolServer:
     def __init__(
@@ -67,6 +94,7 @@ class MultiProtocolServer:
         self.connected_agents = {}
         self.tcp_tunnels = {}
         self.exec_sessions = {}  # Track which client initiated which exec_id
+        self.binary_peers = set()  # Websockets that negotiated binary framing
         self.active_connections = 0
 
         # Public URL (through HAProxy) for clients
@@ -146,14 +174,43 @@ class MultiProtocolServer:
                         "max_connections": self.max_connections,
                         "hostname": socket.gethostname(),
                     }
-                    # Set with TTL of 10 seconds
-                    await self.redis.set(
-                        f"tunnel:{self.server_id}", json.dumps(data), ex=10
-                    )
+                    # Set with TTL of 10 seconds and rank by load
+                    async with self.redis.pipeline(transaction=False) as pipe:
+                        pipe.set(f"tunnel:{self.server_id}", json.dumps(data), ex=10)
+                        pipe.zadd(RELAYS_KEY, {self.server_id: self.active_connections})
+                        await pipe.execute()
                 except Exception as e:
                     logger.warning("Redis heartbeat error: %s", e)
             await asyncio.sleep(5)
 
+    async def _store_agent(self, agent_data):
+        """Stores agent data and updates the registry indexes"""
+        agent_id = str(agent_data["id"])
+        member = f"{(agent_data.get('name') or '').lower()}\x00{agent_id}"
+        previous = await self.redis.hget(AGENTS_LEX_KEY, agent_id)
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.set(f"agent:{agent_id}", json.dumps(agent_data), ex=AGENT_TTL)
+            pipe.zadd(AGENTS_SEEN_KEY, {agent_id: time.time()})
+            if previous and previous != member:
+                pipe.zrem(AGENTS_NAMES_KEY, previous)
+            pipe.zadd(AGENTS_NAMES_KEY, {member: 0})
+            pipe.hset(AGENTS_LEX_KEY, agent_id, member)
+            await pipe.execute()
+
+    async def _remove_agent(self, agent_id):
+        """Removes an agent and its registry index entries"""
+        agent_id = str(agent_id)
+        member = await self.redis.hget(AGENTS_LEX_KEY, agent_id)
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.delete(f"agent:{agent_id}")
+            pipe.zrem(AGENTS_SEEN_KEY, agent_id)
+            if member:
+                pipe.zrem(AGENTS_NAMES_KEY, member)
+            pipe.hdel(AGENTS_LEX_KEY, agent_id)
+            await pipe.execute()
+
     async def register_agent(self, websocket, message):
         """Registers a new agent with connection limit"""
         if self.active_connections >= self.max_connections:
@@ -182,15 +239,17 @@ class MultiProtocolServer:
 
         self.connected_agents[agent_id] = {"websocket": websocket, "data": agent_data}
 
+        binary = message.get("framing") == FRAMING_BINARY
+        if binary:
+            self.binary_peers.add(websocket)
+
         self.active_connections += 1
 
         # Register in Redis
         await self._init_redis()
         if self.redis:
             try:
-                await self.redis.set(
-                    f"agent:{agent_id}", json.dumps(agent_data), ex=300
-                )  # 5 min TTL
+                await self._store_agent(agent_data)
             except Exception as e:
                 logger.warning("Redis error: %s", e)
 
@@ -207,11 +266,10 @@ class MultiProtocolServer:
             services_str,
         )
 
-        await websocket.send(
-            json.dumps(
-                {"type": "registration_ok", "message": "Agent registered successfully"}
-            )
-        )
+        response = {"type": "registration_ok", "message": "Agent registered successfully"}
+        if binary:
+            response["framing"] = FRAMING_BINARY
+        await websocket.send(json.dumps(response))
 
         return True
 
@@ -241,16 +299,19 @@ class MultiProtocolServer:
 
         if agent_id in self.connected_agents:
             # Local agent
+            agent_ws = self.connected_agents[agent_id]["websocket"]
             self.tcp_tunnels[tunnel_id] = {
                 "type": "local",
                 "agent_id": agent_id,
                 "client_ws": websocket,
-                "agent_ws": self.connected_agents[agent_id]["websocket"],
+                "agent_ws": agent_ws,
+                "client_binary": websocket in self.binary_peers,
+                "agent_binary": agent_ws in self.binary_peers,
                 "service": service,
+                "bytes": 0,
             }
 
             # Notify agent
-            agent_ws = self.connected_agents[agent_id]["websocket"]
             await agent_ws.send(
                 json.dumps(
                     {
@@ -287,8 +348,8 @@ class MultiProtocolServer:
                 )
             )
 
-    async def forward_tunnel_data(self, message):
-        """Forwards TCP tunnel data between client and agent"""
+    async def forward_tunnel_data(self, message, message_raw=None):
+        """Forwards TCP tunnel data between client and agent (JSON framing)"""
         tunnel_id = message.get("tunnel_id")
         origin = message.get("origin", "client")
 
@@ -296,24 +357,67 @@ class MultiProtocolServer:
             return
 
         tunnel = self.tcp_tunnels[tunnel_id]
+        tunnel["bytes"] += len(message.get("data", "")) // 2
+
+        # Every peer understands JSON, so the original text is relayed as-is
+        if message_raw is None:
+            message_raw = json.dumps(message)
 
         try:
             if origin == "client":
                 # Client -> Agent
-                await tunnel["agent_ws"].send(json.dumps(message))
+                await tunnel["agent_ws"].send(message_raw)
             else:
                 # Agent -> Client
-                await tunnel["client_ws"].send(json.dumps(message))
+                await tunnel["client_ws"].send(message_raw)
 
         except Exception as e:
             logger.error("Error forwarding tunnel data %s: %s", tunnel_id, e)
             await self.close_tcp_tunnel(tunnel_id)
 
+    async def forward_tunnel_frame(self, frame):
+        """Routes a binary tunnel frame by its header, leaving the payload untouched"""
+        header = parse_tunnel_frame(frame)
+        if header is None:
+            return
+
+        origin, tunnel_id, offset = header
+        tunnel = self.tcp_tunnels.get(tunnel_id)
+        if tunnel is None:
+            return
+
+        tunnel["bytes"] += len(frame) - offset
+
+        if origin == FRAME_ORIGIN_CLIENT:
+            target_ws, target_binary = tunnel["agent_ws"], tunnel["agent_binary"]
+        else:
+            target_ws, target_binary = tunnel["client_ws"], tunnel["client_binary"]
+
+        try:
+            if target_binary:
+                await target_ws.send(frame)
+            else:
+                # JSON-only peer: fall back to the legacy hex encoding
+                await target_ws.send(
+                    json.dumps(
+                        {
+                            "type": "tunnel_data",
+                            "tunnel_id": tunnel_id,
+                            "origin": FRAME_ORIGINS.get(origin, "client"),
+                            "data": memoryview(frame)[offset:].hex(),
+                        }
+                    )
+                )
+        except Exception as e:
+            logger.error("Error forwarding tunnel frame %s: %s", tunnel_id, e)
+            await self.close_tcp_tunnel(tunnel_id)
+
     async def close_tcp_tunnel(self, tunnel_id):
         """Closes a TCP tunnel"""
-        if tunnel_id in self.tcp_tunnels:
-            tunnel = self.tcp_tunnels[tunnel_id]
-
+        # Popped before awaiting so concurrent closes (agent and client
+        # disconnecting together) cannot delete the same tunnel twice
+        tunnel = self.tcp_tunnels.pop(tunnel_id, None)
+        if tunnel is not None:
             # Notify local websockets
             if "client_ws" in tunnel:
                 try:
@@ -331,8 +435,9 @@ class MultiProtocolServer:
                 except Exception:
                     pass
 
-            del self.tcp_tunnels[tunnel_id]
-            logger.info("TCP tunnel closed: %s", tunnel_id)
+            logger.info(
+                "TCP tunnel closed: %s (%s bytes relayed)", tunnel_id, tunnel["bytes"]
+            )
 
     async def execute_remote_command(self, websocket, message):
         """Executes a command on a remote agent."""
@@ -419,17 +524,12 @@ class MultiProtocolServer:
         agents = []
         if self.redis:
             try:
-                # Optimization: Do NOT use keys() with 1M keys.
-                # Use scan_iter with a limit.
-                keys = []
-                count = 0
-                async for key in self.redis.scan_iter("agent:*", count=1000):
-                    keys.append(key)
-                    count += 1
-                    if count >= 1000: # Cap global list for speed
-                        break
-                if keys:
-                    agents_json = await self.redis.mget(keys)
+                # Most recently seen agents first (capped for speed)
+                agent_ids = await self.redis.zrevrange(AGENTS_SEEN_KEY, 0, 999)
+                if agent_ids:
+                    agents_json = await self.redis.mget(
+                        [f"agent:{agent_id}" for agent_id in agent_ids]
+                    )
                     agents = [json.loads(a) for a in agents_json if a]
             except Exception as e:
                 logger.warning("Error fetching agents from Redis: %s", e)
@@ -451,6 +551,14 @@ class MultiProtocolServer:
 
         try:
             async for message_raw in websocket:
+                if isinstance(message_raw, bytes):
+                    # Binary frames are only used for tunnel data
+                    try:
+                        await self.forward_tunnel_frame(message_raw)
+                    except Exception as e:
+                        logger.error("Error: %s", e)
+                    continue
+
                 try:
                     message = json.loads(message_raw)
                     msg_type = message.get("type")
@@ -463,11 +571,11 @@ class MultiProtocolServer:
 
                     elif msg_type == "connect_client":
                         connection_type = "client"
-                        await websocket.send(
-                            json.dumps(
-                                {"type": "connection_ok", "message": "Client connected"}
-                            )
-                        )
+                        response = {"type": "connection_ok", "message": "Client connected"}
+                        if message.get("framing") == FRAMING_BINARY:
+                            self.binary_peers.add(websocket)
+                            response["framing"] = FRAMING_BINARY
+                        await websocket.send(json.dumps(response))
 
                     elif msg_type == "list_agents":
                         await self.list_agents(websocket)
@@ -476,7 +584,7 @@ class MultiProtocolServer:
                         await self.start_tcp_tunnel(websocket, message)
 
                     elif msg_type == "tunnel_data":
-                        await self.forward_tunnel_data(message)
+                        await self.forward_tunnel_data(message, message_raw)
 
                     elif msg_type == "close_tunnel":
                         tunnel_id = message.get("tunnel_id")
@@ -496,6 +604,8 @@ class MultiProtocolServer:
         except websockets.exceptions.ConnectionClosed:
             pass
         finally:
+            self.binary_peers.discard(websocket)
+
             if connection_type == "agent" and agent_id is not None:
                 if agent_id in self.connected_agents:
                     del self.connected_agents[agent_id]
@@ -505,7 +615,7 @@ class MultiProtocolServer:
                     # Remove from Redis
                     if self.redis:
                         try:
-                            await self.redis.delete(f"agent:{agent_id}")
+                            await self._remove_agent(agent_id)
                         except Exception:
                             pass
 
@@ -537,11 +647,16 @@ class MultiProtocolServer:
                 len(self.tcp_tunnels),
             )
 
-            # Update Redis TTL for all connected agents
+            # Refresh TTL and last-seen of all connected agents in one round trip
             if self.redis and self.connected_agents:
                 try:
-                    for agent_id, data in self.connected_agents.items():
-                        await self.redis.expire(f"agent:{agent_id}", 300)
+                    now = time.time()
+                    agent_ids = [str(agent_id) for agent_id in self.connected_agents]
+                    async with self.redis.pipeline(transaction=False) as pipe:
+                        for agent_id in agent_ids:
+                            pipe.expire(f"agent:{agent_id}", AGENT_TTL)
+                        pipe.zadd(AGENTS_SEEN_KEY, dict.fromkeys(agent_ids, now))
+                        await pipe.execute()
                 except Exception as e:
                     logger.warning("Error updating Redis TTL: %s", e)
 
@@ -0,0 +1,285 @@
+#!/usr/bin/python3
+
+# core_api_stub.py - Core API stub for the v4 -> v5 package migration
+#
+# Builds a v4-like media tree (packages and package sets) in a temporary
+# directory, serves the core API endpoints used by
+# build/core/defaults/usr/bin/migrate_packages.py (projects, paginated
+# packages / package-sets lookups, safe package uploads, package set patches,
+# internal sources) and runs the migration script twice:
+#   1. the stub rejects uploads after --fail-after successes, so the run ends
+#      with failures and must keep its journal;
+#   2. a clean run that resumes from the journal and removes it at the end.
+# The script logs its own throughput and ETA; the stub prints what it received.
+#
+# The migasfree/django helpers only exist inside the core image, so this
+# script provides minimal stand-ins for them (settings, get_setting, magic,
+# and wrap/unwrap without JWE, so signing cost is not measured).
+#
+# Usage: python3 test/bench/core_api_stub.py [--packages 2000] [--size-kb 256]
+
+import argparse
+import json
+import os
+import runpy
+import sys
+import tempfile
+import threading
+import time
+import types
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+SCRIPT = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "../../build/core/defaults/usr/bin/migrate_packages.py")
+)
+
+STORE_TRAILING_PATH = "stores"  # As exported by the pms-* images
+JOURNAL_NAME = ".migrate_packages.journal"
+
+
+def build_media(root, projects, packages, package_sets, files_per_set, size):
+    """Creates the media tree and returns the API objects that match it"""
+    api_packages, api_sets = [], []
+    payload = os.urandom(size)
+    for i in range(packages):
+        project = f"project{i % projects}"
+        store = root / project / STORE_TRAILING_PATH
+        store.mkdir(parents=True, exist_ok=True)
+        name = f"pkg{i:06d}_1.0_amd64.deb"
+        (store / name).write_bytes(payload)
+        api_packages.append(
+            {
+                "id": i + 1,
+                "fullname": name,
+                "project": {"name": project},
+                "store": {"name": STORE_TRAILING_PATH},
+            }
+        )
+    for i in range(package_sets):
+        project = f"project{i % projects}"
+        entry = root / project / STORE_TRAILING_PATH / f"set{i:05d}"
+        entry.mkdir(parents=True, exist_ok=True)
+        for j in range(files_per_set):
+            (entry / f"set{i:05d}-{j}.deb").write_bytes(payload)
+        api_sets.append(
+            {
+                "id": i + 1,
+                "name": entry.name,
+                "project": {"name": project, "pms": "apt"},
+                "store": {"name": STORE_TRAILING_PATH},
+            }
+        )
+    return api_packages, api_sets
+
+
+class CoreApiStub:
+    def __init__(self, projects, packages, package_sets, latency):
+        self.projects = [
+            {"id": i + 1, "name": f"project{i}", "slug": f"project{i}", "pms": "apt-get", "platform": {"id": 1}}
+            for i in range(projects)
+        ]
+        self.packages = packages
+        self.package_sets = package_sets
+        self.latency = latency
+        self.fail_after = None  # Reject uploads once this many succeeded
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.uploads = 0
+        self.rejected = 0
+        self.bytes = 0
+        self.lookups = 0
+        self.first = self.last = None
+
+    def page(self, url, items, query):
+        size = int(query.get("page_size", ["100"])[0])
+        page = int(query.get("page", ["1"])[0])
+        results = items[(page - 1) * size : page * size]
+        following = None
+        if page * size < len(items):
+            following = f"{url}?page={page + 1}&page_size={size}"
+        return {"count": len(items), "next": following, "results": results}
+
+    def receive(self, length, rfile):
+        """Consumes an upload body; returns False if the upload is rejected"""
+        remaining = length
+        while remaining:
+            chunk = rfile.read(min(remaining, 1 << 16))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+        time.sleep(self.latency)
+        with self.lock:
+            now = time.monotonic()
+            self.first = self.first or now
+            self.last = now
+            self.bytes += length
+            if self.fail_after is not None and self.uploads >= self.fail_after:
+                self.rejected += 1
+                return False
+            self.uploads += 1
+            return True
+
+    def handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def reply(self, status, body):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                query = parse_qs(url.query)
+                base = f"http://{self.headers['Host']}{url.path}"
+                if url.path == "/api/v1/token/projects/":
+                    self.reply(200, stub.page(base, stub.projects, query))
+                elif url.path == "/api/v1/token/packages/":
+                    with stub.lock:
+                        stub.lookups += 1
+                    self.reply(200, stub.page(base, stub.packages, query))
+                elif url.path == "/api/v1/token/package-sets/":
+                    with stub.lock:
+                        stub.lookups += 1
+                    self.reply(200, stub.page(base, stub.package_sets, query))
+                elif url.path == "/api/v1/token/deployments/internal-sources/":
+                    self.reply(200, {"count": 0, "next": None, "results": []})
+                else:
+                    self.reply(404, {"detail": "Not found."})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                if self.path != "/api/v1/safe/packages/":
+                    self.rfile.read(length)
+                    self.reply(404, {"detail": "Not found."})
+                elif stub.receive(length, self.rfile):
+                    self.reply(200, {"id": 1})
+                else:
+                    self.reply(400, {"detail": "Upload rejected by the stub"})
+
+            def do_PATCH(self):
+                length = int(self.headers.get("Content-Length", 0))
+                if self.path.startswith("/api/v1/token/package-sets/"):
+                    if stub.receive(length, self.rfile):
+                        self.reply(200, {"id": 1})
+                    else:
+                        self.reply(400, {"detail": "Upload rejected by the stub"})
+                else:
+                    self.rfile.read(length)
+                    self.reply(200, {})
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def install_core_stand_ins(media_root, keys_dir):
+    """Minimal stand-ins for the django/migasfree helpers of the core image"""
+    settings_module = {
+        "MIGASFREE_KEYS_DIR": str(keys_dir),
+        "MIGASFREE_STORE_TRAILING_PATH": STORE_TRAILING_PATH,
+    }
+    magic = types.SimpleNamespace(file=lambda path: "application/vnd.debian.binary-package")
+
+    modules = {
+        "django": {},
+        "django.conf": {"settings": types.SimpleNamespace(MEDIA_ROOT=str(media_root))},
+        "migasfree": {},
+        "migasfree.core": {},
+        "migasfree.core.pms": {
+            "get_pms": lambda name: types.SimpleNamespace(mimetype=["application/vnd.debian.binary-package"])
+        },
+        "migasfree.core.validators": {"build_magic": lambda: magic},
+        "migasfree.secure": {
+            "wrap": lambda data, sign_key, encrypt_key: json.dumps(data),
+            "unwrap": lambda msg, decrypt_key, verify_key: json.loads(msg),
+        },
+        "migasfree.utils": {
+            "get_secret": lambda name: None,
+            "get_setting": settings_module.get,
+        },
+    }
+    for name, attrs in modules.items():
+        module = types.ModuleType(name)
+        module.__dict__.update(attrs)
+        sys.modules[name] = module
+
+
+def run_migration(label, stub, journal):
+    print(f"\n=== {label} ===", flush=True)
+    stub.reset()
+    started = time.monotonic()
+    try:
+        runpy.run_path(SCRIPT, run_name="__main__")
+        code = 0
+    except SystemExit as e:
+        code = e.code or 0
+    elapsed = time.monotonic() - started
+
+    transfer = (stub.last - stub.first) if stub.first and stub.last else 0
+    entries = len(journal.read_text().splitlines()) if journal.exists() else 0
+    print(
+        f"exit code {code} in {elapsed:.1f}s: {stub.uploads} accepted, {stub.rejected} rejected, "
+        f"{stub.bytes / 1048576:.0f} MiB received"
+        + (f" ({stub.bytes / 1048576 / transfer:.1f} MiB/s)" if transfer else "")
+        + f", {stub.lookups} lookup pages\n"
+        f"journal: {'kept with ' + str(entries) + ' entries' if journal.exists() else 'removed'}",
+        flush=True,
+    )
+
+
+def main(args):
+    with tempfile.TemporaryDirectory(prefix="migration-bench-") as tmp:
+        media_root = Path(tmp) / "media"
+        keys_dir = Path(tmp) / "keys"
+        media_root.mkdir()
+        keys_dir.mkdir()
+
+        api_packages, api_sets = build_media(
+            media_root, args.projects, args.packages, args.package_sets, args.files_per_set, args.size_kb * 1024
+        )
+        stub = CoreApiStub(args.projects, api_packages, api_sets, args.latency / 1000)
+        server = ThreadingHTTPServer(("127.0.0.1", 0), stub.handler())
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        os.environ["MIGASFREE_FQDN"] = f"127.0.0.1:{server.server_port}"
+        os.environ["MIGASFREE_TOKEN"] = "bench-token"
+        install_core_stand_ins(media_root, keys_dir)
+
+        total = args.packages * args.size_kb + args.package_sets * args.files_per_set * args.size_kb
+        print(
+            f"core API stub on http://{os.environ['MIGASFREE_FQDN']}: {args.packages} packages and "
+            f"{args.package_sets} package sets ({total / 1024:.0f} MiB) in {args.projects} projects, "
+            f"{args.latency:.0f} ms per upload"
+        )
+
+        journal = media_root / JOURNAL_NAME
+        stub.fail_after = args.fail_after
+        run_migration(f"run 1: uploads rejected after {args.fail_after}", stub, journal)
+        stub.fail_after = None
+        run_migration("run 2: resume from the journal", stub, journal)
+
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Core API stub for the package migration")
+    parser.add_argument("--projects", type=int, default=4, help="projects in the media tree")
+    parser.add_argument("--packages", type=int, default=2000, help="individual packages")
+    parser.add_argument("--package-sets", type=int, default=100, help="package sets")
+    parser.add_argument("--files-per-set", type=int, default=5, help="files in each package set")
+    parser.add_argument("--size-kb", type=int, default=256, help="size of every package file")
+    parser.add_argument("--latency", type=float, default=20, help="ms the stub core spends per upload")
+    parser.add_argument("--fail-after", type=int, default=1200, help="uploads accepted in the first run")
+    main(parser.parse_args())
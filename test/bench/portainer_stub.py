@@ -0,0 +1,186 @@
+#!/usr/bin/python3
+
+# portainer_stub.py - Portainer stub for the manager CPU load collector
+#
+# Serves the Portainer endpoints used by core/availability.py (endpoints,
+# swarm nodes, container listing, one-shot container stats) for many
+# containers, with a configurable per-stats latency to mimic cross-node
+# proxying. Runs collect_services_cpu_load() against it and prints the
+# collection duration, container count and request concurrency per round.
+#
+# Usage: python3 test/bench/portainer_stub.py [--containers 200] [--latency 50]
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MANAGER_DIR = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "../../build/manager/defaults/usr/share/manager")
+)
+
+# Watched by refresh_server_metrics, plus one service the collector filters out
+SERVICES = ["bench_core", "bench_database", "bench_frontend"]
+SUFFIXES = ["_core", "_database"]
+
+
+class PortainerStub:
+    def __init__(self, containers, nodes, latency):
+        self.latency = latency
+        self.nodes = [
+            {
+                "ID": f"node{i}",
+                "Status": {"Addr": f"10.0.0.{i + 1}"},
+                "Description": {"Hostname": f"worker{i}"},
+            }
+            for i in range(nodes)
+        ]
+        self.containers = []
+        self.counters = {}
+        for i in range(containers):
+            cid = f"{i:012x}{os.urandom(26).hex()}"
+            self.containers.append(
+                {
+                    "Id": cid,
+                    "Labels": {
+                        "com.docker.swarm.service.name": SERVICES[i % len(SERVICES)],
+                        "com.docker.swarm.node.id": f"node{i % nodes}",
+                    },
+                    "NetworkSettings": {
+                        "Networks": {"inv_network": {"IPAddress": f"10.1.{i // 250}.{i % 250 + 1}"}}
+                    },
+                }
+            )
+            self.counters[cid] = [0, 0]
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def stats(self, cid):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            counter = self.counters[cid]
+            counter[1] += 10**9
+            counter[0] += int(random.uniform(0.05, 0.9) * 10**9 / 4)
+            cpu, system = counter
+        time.sleep(self.latency)
+        with self.lock:
+            self.in_flight -= 1
+        return {
+            "cpu_stats": {
+                "cpu_usage": {"total_usage": cpu},
+                "system_cpu_usage": system,
+                "online_cpus": 4,
+            }
+        }
+
+    def handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # Keep-alive, as the pooled session expects
+
+            def do_GET(self):
+                with stub.lock:
+                    stub.requests += 1
+                path = self.path.split("?", 1)[0]
+                parts = path.strip("/").split("/")
+                if path == "/api/endpoints":
+                    body = [{"Id": 1, "Type": 2, "Name": "primary"}]
+                elif path == "/api/endpoints/1/docker/nodes":
+                    body = stub.nodes
+                elif path == "/api/endpoints/1/docker/containers/json":
+                    body = stub.containers
+                elif len(parts) == 7 and parts[6] == "stats" and parts[5] in stub.counters:
+                    body = stub.stats(parts[5])
+                else:
+                    self.send_error(404)
+                    return
+                data = json.dumps(body).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def run_rounds(availability, stub, label, rounds):
+    print(f"\n{label}")
+    print(
+        f"{'round':>5} {'containers':>10} {'seconds':>8} {'stats/s':>8} "
+        f"{'max parallel':>12} {'core avg':>9} {'db avg':>7}"
+    )
+    for i in range(1, rounds + 1):
+        stub.max_in_flight = 0
+        results, duration = availability.collect_services_cpu_load(SUFFIXES)
+        containers = sum(len(results[s]["container_map"]) for s in SUFFIXES)
+        print(
+            f"{i:>5} {containers:>10} {duration:>8.2f} {containers / duration:>8.0f} {stub.max_in_flight:>12} "
+            f"{results['_core']['avg']:>9.1f} {results['_database']['avg']:>7.1f}"
+        )
+
+
+def main(args):
+    os.environ.setdefault("FQDN", "localhost")
+    os.environ.setdefault("STACK", "bench")
+    sys.path.insert(0, MANAGER_DIR)
+    from core import availability
+
+    stub = PortainerStub(args.containers, args.nodes, args.latency / 1000)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), stub.handler())
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    with tempfile.NamedTemporaryFile("w", suffix="-portainer-token") as token:
+        token.write("bench-token")
+        token.flush()
+
+        # Point the collector at the stub
+        availability.PORTAINER_URL = f"http://127.0.0.1:{server.server_port}/api"
+        availability.PORTAINER_TOKEN_FILE = token.name
+
+        watched = sum(
+            1
+            for c in stub.containers
+            if c["Labels"]["com.docker.swarm.service.name"].endswith(tuple(SUFFIXES))
+        )
+        print(
+            f"portainer stub on {availability.PORTAINER_URL}: {args.containers} containers "
+            f"({watched} watched) on {args.nodes} nodes, {args.latency:.0f} ms per stats request"
+        )
+
+        # The first round only primes the CPU delta cache (loads are 0.0)
+        run_rounds(
+            availability,
+            stub,
+            f"concurrent stats (PORTAINER_STATS_CONCURRENCY={availability.PORTAINER_STATS_CONCURRENCY})",
+            args.rounds,
+        )
+        if args.sequential:
+            availability.PORTAINER_STATS_CONCURRENCY = 1
+            run_rounds(availability, stub, "sequential stats (one request at a time)", args.rounds)
+
+    print(f"\nstub requests served: {stub.requests}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Portainer stub for the CPU load collector")
+    parser.add_argument("--containers", type=int, default=200, help="containers served by the stub")
+    parser.add_argument("--nodes", type=int, default=5, help="swarm nodes")
+    parser.add_argument("--latency", type=float, default=50, help="ms per container stats request")
+    parser.add_argument("--rounds", type=int, default=3, help="collections per mode")
+    parser.add_argument("--sequential", action="store_true", help="also run with one stats request at a time")
+    main(parser.parse_args())
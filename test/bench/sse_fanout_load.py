@@ -0,0 +1,285 @@
+#!/usr/bin/python3
+
+# sse_fanout_load.py - Load test of the manager status SSE fan-out
+#
+# Starts a local stub of the monitor (core.broadcast.BroadcastHub fed with
+# synthetic service status and log events, served by the same /stream
+# generator as routers/status.py) in a child process, then connects thousands
+# of simulated SSE clients to it. A fraction of the clients read slowly to
+# force coalescing. Prints the hub gauges every second and a summary.
+#
+# Usage: python3 test/bench/sse_fanout_load.py [--clients 2000] [--duration 20]
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import socket
+import subprocess
+import sys
+import time
+from contextlib import asynccontextmanager
+
+MANAGER_DIR = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "../../build/manager/defaults/usr/share/manager")
+)
+
+STATES = ["healthy", "degraded", "starting", "down"]
+EVENT_SEPARATOR = b"\r\n\r\n"
+
+
+# Stub monitor (child process)
+
+
+def serve(args):
+    sys.path.insert(0, MANAGER_DIR)
+
+    import uvicorn
+    from fastapi import FastAPI, Request
+    from sse_starlette.sse import EventSourceResponse
+
+    from core.broadcast import BroadcastHub, render_event
+
+    hub = BroadcastHub()
+    services = [f"stack_service{i}" for i in range(args.services)]
+
+    def service_status(name):
+        running = random.randint(0, 3)
+        return {
+            "running": running,
+            "desired": 3,
+            "preparing": 3 - running,
+            "failed": 0,
+            "status": random.choice(STATES),
+            "mode": "replicated",
+            "nodes": [f"node{random.randint(1, 5)}"],
+            "containers": [os.urandom(6).hex()],
+        }
+
+    def publish(event, data):
+        # Same keying as DockerSwarmMonitor.broadcast_to_sse_clients
+        key = data.get("service") if event == "status" else None
+        hub.publish(event, data, key=key)
+
+    for name in services:
+        publish("status", {"service": name, "status": service_status(name), "timestamp": time.time()})
+
+    async def stub_monitor():
+        """Publishes status events at --rate per second, one log event every --log-every"""
+        interval = 1 / args.rate
+        sent = 0
+        next_at = time.monotonic()
+        while True:
+            name = random.choice(services)
+            status = service_status(name)
+            publish("status", {"service": name, "status": status, "timestamp": time.time()})
+            sent += 1
+            if sent % args.log_every == 0:
+                publish(
+                    "log",
+                    {
+                        "timestamp": time.time(),
+                        "service": name,
+                        "text": f"Status: {status['status']} ({status['running']}/{status['desired']})",
+                        "node": ", ".join(status["nodes"]),
+                        "container": ", ".join(status["containers"]),
+                    },
+                )
+            next_at += interval
+            await asyncio.sleep(max(0.0, next_at - time.monotonic()))
+
+    @asynccontextmanager
+    async def lifespan(app):
+        monitor = asyncio.create_task(stub_monitor())
+        yield
+        monitor.cancel()
+
+    app = FastAPI(lifespan=lifespan)
+
+    @app.get("/stream")
+    async def service_stream(request: Request):
+        # Mirrors routers/status.py::service_stream
+        subscriber, initial = hub.subscribe()
+
+        async def event_generator():
+            try:
+                yield initial
+                while True:
+                    if await request.is_disconnected():
+                        break
+                    if await subscriber.wait(timeout=30):
+                        yield subscriber.drain()
+                    else:
+                        yield render_event("ping", {"timestamp": time.time()})
+            finally:
+                hub.unsubscribe(subscriber)
+
+        return EventSourceResponse(event_generator())
+
+    @app.get("/stats")
+    async def stats():
+        return hub.stats()
+
+    uvicorn.run(app, host="127.0.0.1", port=args.serve, log_level="warning", backlog=4096)
+
+
+# Simulated clients (parent process)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def process_cpu(pid):
+    """Returns user + system CPU seconds of a process (Linux /proc)"""
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def raise_fd_limit(needed):
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < needed:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(needed, hard), hard))
+
+
+async def http_get(port, path):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"GET {path} HTTP/1.0\r\nHost: localhost\r\n\r\n".encode())
+    body = (await reader.read()).split(b"\r\n\r\n", 1)[1]
+    writer.close()
+    return json.loads(body)
+
+
+async def sse_client(port, slow, totals, ready, stop):
+    """Reads the stream counting events; slow clients pause between reads"""
+    connected_at = time.perf_counter()
+    try:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    except OSError:
+        totals["failed"] += 1
+        return
+    # HTTP/1.0: no chunked encoding, the body is the raw event stream
+    writer.write(b"GET /stream HTTP/1.0\r\nHost: localhost\r\nAccept: text/event-stream\r\n\r\n")
+    tail = b""
+    initialized = False
+    try:
+        while not stop.is_set():
+            chunk = await reader.read(65536)
+            if not chunk:
+                break
+            totals["bytes"] += len(chunk)
+            data = tail + chunk
+            totals["events"] += data.count(EVENT_SEPARATOR)
+            tail = data[-3:]
+            if not initialized and b'"init": true' in data:
+                initialized = True
+                totals["connect_times"].append(time.perf_counter() - connected_at)
+                ready.release()
+            if slow:
+                await asyncio.sleep(random.uniform(0.5, 2.0))
+    finally:
+        writer.close()
+
+
+async def run(args):
+    raise_fd_limit(args.clients + 256)
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--serve", str(port)] + sys.argv[1:],
+    )
+    try:
+        for _ in range(100):
+            try:
+                await http_get(port, "/stats")
+                break
+            except (OSError, IndexError):
+                await asyncio.sleep(0.1)
+
+        totals = {"bytes": 0, "events": 0, "failed": 0, "connect_times": []}
+        ready = asyncio.Semaphore(0)
+        stop = asyncio.Event()
+        slow_clients = int(args.clients * args.slow)
+        print(
+            f"stub monitor pid {server.pid} on port {port}: {args.services} services, "
+            f"{args.rate} status events/s, {args.clients} clients ({slow_clients} slow)"
+        )
+
+        started = time.perf_counter()
+        clients = []
+        for i in range(args.clients):
+            clients.append(asyncio.create_task(sse_client(port, i < slow_clients, totals, ready, stop)))
+            if i % 200 == 199:
+                await asyncio.sleep(0)  # Let the accept queue drain
+        for _ in range(args.clients - totals["failed"]):
+            await ready.acquire()
+        connect_elapsed = time.perf_counter() - started
+        times = sorted(totals["connect_times"])
+        print(
+            f"connected {len(times)} clients in {connect_elapsed:.2f}s "
+            f"(initial state p50 {1000 * times[len(times) // 2]:.0f} ms, "
+            f"p99 {1000 * times[int(len(times) * 0.99)]:.0f} ms, failed {totals['failed']})"
+        )
+
+        print(
+            f"{'t':>4} {'subs':>6} {'published':>9} {'recv ev/s':>10} {'recv MB/s':>9} "
+            f"{'max_pending':>11} {'max_lag_ms':>10} {'coalesced':>10} {'dropped':>8} {'server cpu':>10}"
+        )
+        first = await http_get(port, "/stats")
+        cpu_start = last_cpu = process_cpu(server.pid)
+        base_events, base_bytes = totals["events"], totals["bytes"]
+        last_events, last_bytes = base_events, base_bytes
+        measure_start = time.perf_counter()
+        for second in range(1, args.duration + 1):
+            await asyncio.sleep(1)
+            stats = await http_get(port, "/stats")
+            cpu = process_cpu(server.pid)
+            print(
+                f"{second:>4} {stats['subscribers']:>6} {stats['events_published'] - first['events_published']:>9} "
+                f"{totals['events'] - last_events:>10} {(totals['bytes'] - last_bytes) / 1048576:>9.2f} "
+                f"{stats['max_pending']:>11} {stats['max_lag_ms']:>10} {stats['coalesced']:>10} "
+                f"{stats['dropped_logs']:>8} {100 * (cpu - last_cpu):>9.0f}%"
+            )
+            last_events, last_bytes, last_cpu = totals["events"], totals["bytes"], cpu
+        elapsed = time.perf_counter() - measure_start
+
+        published = stats["events_published"] - first["events_published"]
+        delivered = totals["events"] - base_events
+        print(
+            f"\nevents published (rendered once each): {published} ({published / elapsed:.0f}/s)\n"
+            f"per-client encoding would have been:   {published * args.clients}\n"
+            f"events delivered to clients:           {delivered} ({delivered / elapsed:.0f}/s, "
+            f"{(totals['bytes'] - base_bytes) / 1048576 / elapsed:.2f} MB/s)\n"
+            f"coalesced / dropped log events:        {stats['coalesced']} / {stats['dropped_logs']}\n"
+            f"server cpu:                            {process_cpu(server.pid) - cpu_start:.2f}s "
+            f"over {elapsed:.1f}s"
+        )
+
+        stop.set()
+        for task in clients:
+            task.cancel()
+        await asyncio.gather(*clients, return_exceptions=True)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SSE fan-out load test against a stub monitor")
+    parser.add_argument("--clients", type=int, default=2000, help="simulated SSE clients")
+    parser.add_argument("--slow", type=float, default=0.1, help="fraction of slow-reading clients")
+    parser.add_argument("--services", type=int, default=60, help="services in the stub swarm")
+    parser.add_argument("--rate", type=float, default=50, help="status events per second")
+    parser.add_argument("--log-every", type=int, default=5, help="one log event every N status events")
+    parser.add_argument("--duration", type=int, default=20, help="measured seconds")
+    parser.add_argument("--serve", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+    else:
+        asyncio.run(run(args))
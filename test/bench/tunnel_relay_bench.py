@@ -0,0 +1,206 @@
+#!/usr/bin/python3
+
+# tunnel_relay_bench.py - Relay throughput benchmark (JSON/hex vs binary framing)
+#
+# Starts the tunnel relay (build/tunnel/.../main.py) on a local port without
+# Redis, registers a stub agent, opens N tunnels from stub clients and pushes
+# bulk data client -> agent through them. Prints MB/s and the relay CPU cost
+# for each framing mode.
+#
+# Usage: python3 test/bench/tunnel_relay_bench.py [--tunnels 4] [--mb 32]
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import uuid
+
+import websockets
+
+RELAY_DIR = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "../../build/tunnel/defaults/usr/share/tunnel")
+)
+
+FRAME_MAGIC = 0xB7
+FRAME_ORIGIN_CLIENT = 0
+
+# (name, client framing, agent framing)
+MODES = [
+    ("json", None, None),
+    ("binary", "binary", "binary"),
+    ("binary->json", "binary", None),
+]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_relay(port):
+    env = dict(
+        os.environ,
+        REDIS_URL="redis://127.0.0.1:1/0",  # unreachable: the relay runs without Redis
+        FQDN="localhost",
+        TUNNEL_CONNECTIONS="1000",
+    )
+    code = (
+        "import asyncio, logging, main; "
+        "logging.basicConfig(level=logging.ERROR); "
+        f"asyncio.run(main.MultiProtocolServer(host='127.0.0.1', port={port}, "
+        "max_connections=1000, redis_url=main.REDIS_URL).start())"
+    )
+    return subprocess.Popen([sys.executable, "-c", code], cwd=RELAY_DIR, env=env, stderr=subprocess.DEVNULL)
+
+
+def wait_port(port, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"relay did not listen on port {port}")
+
+
+def process_cpu(pid):
+    """Returns user + system CPU seconds of a process (Linux /proc)"""
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+async def stub_agent(url, framing, received, done, expected):
+    """Registers an agent and counts the tunnel payload bytes it receives"""
+    async with websockets.connect(url, max_size=10**7) as ws:
+        msg = {
+            "type": "register_agent",
+            "id": f"bench-agent-{uuid.uuid4().hex[:8]}",
+            "name": "bench-agent",
+            "services": ["ssh"],
+        }
+        if framing:
+            msg["framing"] = framing
+        await ws.send(json.dumps(msg))
+        reply = json.loads(await ws.recv())
+        assert reply["type"] == "registration_ok", reply
+        received["agent_id"] = msg["id"]
+        received["ready"].set()
+
+        async for raw in ws:
+            if isinstance(raw, bytes):
+                received["bytes"] += len(raw) - 3 - raw[2]
+            else:
+                data = json.loads(raw)
+                if data.get("type") == "tunnel_data":
+                    received["bytes"] += len(data["data"]) // 2
+            if received["bytes"] >= expected:
+                done.set()
+                return
+
+
+async def stub_client(url, framing, agent_id, payload, total):
+    """Opens a tunnel to the agent and pushes `total` bytes through it"""
+    async with websockets.connect(url, max_size=10**7) as ws:
+        msg = {"type": "connect_client"}
+        if framing:
+            msg["framing"] = framing
+        await ws.send(json.dumps(msg))
+        json.loads(await ws.recv())
+
+        tunnel_id = str(uuid.uuid4())
+        await ws.send(
+            json.dumps(
+                {
+                    "type": "start_tcp_tunnel",
+                    "id": agent_id,
+                    "tunnel_id": tunnel_id,
+                    "service": "ssh",
+                    "client_cn": "bench",
+                }
+            )
+        )
+        reply = json.loads(await ws.recv())
+        assert reply["type"] == "tunnel_started", reply
+
+        if framing == "binary":
+            tid = tunnel_id.encode()
+            frame = bytes((FRAME_MAGIC, FRAME_ORIGIN_CLIENT, len(tid))) + tid + payload
+        else:
+            frame = json.dumps(
+                {
+                    "type": "tunnel_data",
+                    "tunnel_id": tunnel_id,
+                    "origin": "client",
+                    "data": payload.hex(),
+                }
+            )
+
+        sent = 0
+        while sent < total:
+            await ws.send(frame)
+            sent += len(payload)
+
+
+async def run_mode(url, pid, name, client_framing, agent_framing, args):
+    payload = os.urandom(args.chunk)
+    per_tunnel = args.mb * 1024 * 1024 // args.chunk * args.chunk
+    expected = per_tunnel * args.tunnels
+
+    received = {"bytes": 0, "ready": asyncio.Event()}
+    done = asyncio.Event()
+    agent = asyncio.create_task(stub_agent(url, agent_framing, received, done, expected))
+    await received["ready"].wait()
+
+    cpu_start = process_cpu(pid)
+    start = time.perf_counter()
+    clients = [
+        asyncio.create_task(stub_client(url, client_framing, received["agent_id"], payload, per_tunnel))
+        for _ in range(args.tunnels)
+    ]
+    await asyncio.wait_for(done.wait(), timeout=args.timeout)
+    elapsed = time.perf_counter() - start
+    cpu = process_cpu(pid) - cpu_start
+
+    for task in clients:
+        await task
+    await agent
+
+    mb = expected / (1024 * 1024)
+    print(
+        f"{name:<14} {args.tunnels:>7} {mb:>9.0f} {elapsed:>8.2f} {mb / elapsed:>9.1f} "
+        f"{cpu:>9.2f} {100 * cpu / elapsed:>6.0f}% {1000 * cpu / mb:>10.2f} {1000 * cpu / args.tunnels:>11.0f}"
+    )
+
+
+async def main(args):
+    port = free_port()
+    relay = start_relay(port)
+    try:
+        wait_port(port)
+        url = f"ws://127.0.0.1:{port}"
+        print(f"relay pid {relay.pid} on {url}, chunk {args.chunk} bytes, {args.mb} MB per tunnel")
+        print(
+            f"{'mode':<14} {'tunnels':>7} {'MB':>9} {'seconds':>8} {'MB/s':>9} "
+            f"{'cpu s':>9} {'cpu':>7} {'cpu ms/MB':>10} {'cpu ms/tun':>11}"
+        )
+        for name, client_framing, agent_framing in MODES:
+            await run_mode(url, relay.pid, name, client_framing, agent_framing, args)
+    finally:
+        relay.terminate()
+        relay.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tunnel relay throughput benchmark")
+    parser.add_argument("--tunnels", type=int, default=4, help="concurrent tunnels")
+    parser.add_argument("--mb", type=int, default=32, help="MB pushed through each tunnel")
+    parser.add_argument("--chunk", type=int, default=16384, help="payload bytes per message")
+    parser.add_argument("--timeout", type=float, default=300, help="seconds per mode")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,95 @@
+#!/usr/bin/python3
+
+# metrics_store_check.py - Checks of the manager tiered metrics store
+#
+# - record -> query_since(last decoded ts) returns nothing new, even when the
+#   timestamp rounds down when encoded
+# - legacy JSON history is converted into the raw tier (and rollups) before
+#   the legacy key is removed
+#
+# Runs against $REDIS_URL (use a scratch database: the metrics keys are
+# deleted) or, when unset, an in-process fakeredis.
+#
+# Usage: python3 test/metrics_store_check.py
+
+import json
+import os
+import sys
+import time
+
+MANAGER_DIR = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "../build/manager/defaults/usr/share/manager")
+)
+
+
+def connect():
+    if os.environ.get("REDIS_URL"):
+        import redis
+
+        return redis.from_url(os.environ["REDIS_URL"], decode_responses=True)
+    import fakeredis
+
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+def sample(ts, cpu=10.0):
+    return {"ts": ts, "saturated": 0, "db_latency": 0.002, "core_cpu": cpu, "db_cpu": 5.0, "attempts": 1}
+
+
+def reset(con, metrics):
+    con.delete(*[metrics._key(tier) for tier, _, _, _ in metrics.TIERS], metrics.ROLLUP_KEY)
+    con.delete(metrics.LEGACY_HISTORY_KEY)
+
+
+def check_since_is_exclusive(con, metrics):
+    reset(con, metrics)
+    now = time.time()
+    # .1234 rounds down, .1236 rounds up when encoded with 3 decimals
+    for ts in (now - 30.8766, now - 15.8764, now - 0.8766):
+        metrics.record_sample(sample(ts), con=con)
+
+    latest = metrics.query_latest(con=con)
+    assert len(latest) == 3, latest
+    last_ts = latest[-1]["ts"]
+    assert metrics.query_since(last_ts, con=con) == [], "since returned an already received sample"
+    assert len(metrics.query_since(latest[0]["ts"], con=con)) == 2
+
+
+def check_legacy_history_is_converted(con, metrics):
+    reset(con, metrics)
+    now = time.time()
+    entries = {
+        json.dumps({**sample(now - age, cpu=age % 50), "cluster_nodes": []}): now - age
+        for age in range(3600, 0, -15)
+    }
+    entries["not json"] = now - 10
+    con.zadd(metrics.LEGACY_HISTORY_KEY, entries)
+
+    converted = metrics.migrate_legacy_history(con=con)
+    assert converted == 240, converted
+    assert not con.exists(metrics.LEGACY_HISTORY_KEY)
+    assert len(metrics.query_latest(con=con)) == 240
+    assert con.zcard(metrics._key("1m")) >= 59
+    assert con.hget(metrics.ROLLUP_KEY, "1m") is not None
+
+    # The bucket in progress is rolled up once by the next recordings
+    minute = con.hget(metrics.ROLLUP_KEY, "1m")
+    metrics.record_sample(sample(float(minute) + 61), con=con)
+    assert len(con.zrangebyscore(metrics._key("1m"), minute, minute)) == 1
+
+
+def main():
+    sys.path.insert(0, MANAGER_DIR)
+    os.environ.setdefault("FQDN", "localhost")
+    os.environ.setdefault("STACK", "check")
+    from core import metrics
+
+    con = connect()
+    for check in (check_since_is_exclusive, check_legacy_history_is_converted):
+        check(con, metrics)
+        print(f"ok {check.__name__}")
+    reset(con, metrics)
+
+
+if __name__ == "__main__":
+    main()